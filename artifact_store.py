@@ -0,0 +1,227 @@
+import io
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from drive import DOWNLOAD_DIR, drive_response
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated fallback chain, tried left to right: local, mirror, drive
+ARTIFACT_STORES = os.getenv("ARTIFACT_STORES", "local,mirror,drive")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", DOWNLOAD_DIR)
+ARTIFACT_MIRROR_URL = os.getenv("ARTIFACT_MIRROR_URL")
+
+class ArtifactNotFound(FileNotFoundError):
+    pass
+
+class _MeteredStream(io.RawIOBase):
+    # Counts bytes and read time of an opened artifact and reports them on close
+    def __init__(self, raw, on_close, release=None):
+        self._raw = raw
+        self._on_close = on_close
+        self._release = release
+        self.bytes_read = 0
+        self.read_seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._raw.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._raw.seek(offset, whence)
+
+    def tell(self):
+        return self._raw.tell()
+
+    def readinto(self, b):
+        start = time.perf_counter()
+        n = self._raw.readinto(b)
+        self.read_seconds += time.perf_counter() - start
+        self.bytes_read += n or 0
+        return n
+
+    def close(self):
+        if not self.closed:
+            try:
+                (self._release or self._raw.close)()
+            finally:
+                self._on_close(self.bytes_read, self.read_seconds)
+        super().close()
+
+class ArtifactStore:
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"opens": 0, "misses": 0, "errors": 0, "open_seconds": 0.0, "bytes": 0, "read_seconds": 0.0}
+
+    def _open(self, file_name):
+        # Returns (raw binary stream, release callable or None)
+        raise NotImplementedError
+
+    def _record(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def open(self, file_name):
+        start = time.perf_counter()
+        try:
+            raw, release = self._open(file_name)
+        except ArtifactNotFound:
+            self._record(misses=1)
+            metrics.ARTIFACT_OPENS.labels(self.name, "miss").inc()
+            raise
+        except Exception:
+            self._record(errors=1)
+            metrics.ARTIFACT_OPENS.labels(self.name, "error").inc()
+            raise
+        open_seconds = time.perf_counter() - start
+        self._record(opens=1, open_seconds=open_seconds)
+        metrics.ARTIFACT_OPENS.labels(self.name, "ok").inc()
+        metrics.ARTIFACT_SECONDS.labels(self.name).inc(open_seconds)
+        def on_close(nbytes, seconds):
+            self._record(bytes=nbytes, read_seconds=seconds)
+            metrics.ARTIFACT_BYTES.labels(self.name).inc(nbytes)
+            metrics.ARTIFACT_SECONDS.labels(self.name).inc(seconds)
+        return io.BufferedReader(_MeteredStream(raw, on_close, release), buffer_size=1 << 16)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.name
+        stats["avg_open_ms"] = 1000 * stats["open_seconds"] / stats["opens"] if stats["opens"] else None
+        stats["throughput"] = stats["bytes"] / stats["read_seconds"] if stats["read_seconds"] > 0 else None
+        return stats
+
+class LocalStore(ArtifactStore):
+    name = "local"
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+
+    def _open(self, file_name):
+        path = os.path.join(self.root, file_name)
+        if not os.path.isfile(path):
+            raise ArtifactNotFound(f"{file_name} not found in {self.root}")
+        return io.FileIO(path, "r"), None
+
+class HTTPStore(ArtifactStore):
+    name = "mirror"
+
+    def __init__(self, base_url, session=None, timeout=30):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def _open(self, file_name):
+        response = self.session.get(f"{self.base_url}/{file_name}", stream=True, timeout=self.timeout)
+        if response.status_code == 404:
+            response.close()
+            raise ArtifactNotFound(f"{file_name} not found on {self.base_url}")
+        if response.status_code != 200:
+            response.close()
+            raise ValueError(f"Failed to download {file_name} from {self.base_url}: {response.status_code}")
+        return _response_stream(response), response.close
+
+class DriveStore(ArtifactStore):
+    name = "drive"
+
+    def __init__(self, file_ids, base_url=None, session=None):
+        super().__init__()
+        self.file_ids = file_ids
+        self.base_url = base_url
+        self.session = session or requests.Session()
+
+    def _open(self, file_name):
+        file_id = self.file_ids.get(file_name)
+        if not file_id:
+            raise ArtifactNotFound(f"No file ID found for {file_name}")
+        response = drive_response(self.session, file_id, file_name, base_url=self.base_url)
+        if response.status_code != 200:
+            detail = response.text
+            response.close()
+            raise ValueError(f"Failed to download {file_name}: {response.status_code} - {detail}")
+        return _response_stream(response), response.close
+
+class FallbackStore(ArtifactStore):
+    name = "chain"
+
+    def __init__(self, stores):
+        super().__init__()
+        self.stores = stores
+
+    def open(self, file_name):
+        error = None
+        for store in self.stores:
+            try:
+                return store.open(file_name)
+            except ArtifactNotFound as e:
+                error = error or e
+            except Exception as e:
+                logger.warning(f"Artifact store {store.name} failed for {file_name}: {e}")
+                error = e
+        raise error or ArtifactNotFound(file_name)
+
+    def stats(self):
+        return {store.name: store.stats() for store in self.stores}
+
+def _response_stream(response):
+    response.raw.decode_content = True
+    # Leave the body readable at EOF; the caller closes the response
+    response.raw.auto_close = False
+    return response.raw
+
+def create_store(spec=None, file_ids=None, local_dir=None, mirror_url=None, drive_url=None):
+    if file_ids is None:
+        from model_loader import MODEL_FILE_IDS
+        from data_loader import CSV_FILE_IDS
+        file_ids = {**MODEL_FILE_IDS, **CSV_FILE_IDS}
+    mirror_url = mirror_url or ARTIFACT_MIRROR_URL
+    stores = []
+    for name in (spec or ARTIFACT_STORES).split(","):
+        name = name.strip().lower()
+        if name == "local":
+            stores.append(LocalStore(local_dir or ARTIFACT_DIR))
+        elif name == "mirror":
+            if mirror_url:
+                stores.append(HTTPStore(mirror_url))
+        elif name == "drive":
+            stores.append(DriveStore(file_ids, base_url=drive_url))
+        elif name:
+            raise ValueError(f"Unknown artifact store: {name}")
+    if not stores:
+        raise ValueError(f"No artifact stores configured from {spec or ARTIFACT_STORES!r}")
+    return FallbackStore(stores)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+def register_file_id(file_name, file_id):
+    # Makes an artifact published after startup (e.g. a new model version) fetchable from Drive
+    store = get_store()
+    for member in getattr(store, "stores", [store]):
+        if isinstance(member, DriveStore):
+            member.file_ids[file_name] = file_id
+
+def set_store(store):
+    # Swap the process-wide store, e.g. a LocalStore for offline runs and benchmarks
+    global _store
+    _store = store
@@ -0,0 +1,197 @@
+import argparse
+import copy
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+# Compaction stage for the RandomForest models. It starts from the trained
+# forest and builds smaller candidates three ways: refits with depth/leaf
+# limits, greedy subsets of the existing trees, and shallow forests distilled
+# from the teacher's probabilities. Each candidate is measured on ROC-AUC,
+# pickled size and p99 single-row latency. The report lists the Pareto
+# frontier, and the best candidate inside the size/latency budget is written
+# next to the original model.
+
+MODEL_DIR = "backend/model"
+REPORT_PATH = "data/compaction_report.json"
+
+MODELS = {
+    "loan": {
+        "data": "data/loan_data.csv",
+        "target": "Default",
+        "model": "loan_model.pkl",
+        "scaler": "scaler.pkl",
+    },
+    "credit_risk": {
+        "data": "data/credit_risk_data_encoded.csv",
+        "target": "loan_status",
+        "model": "credit_risk_model.pkl",
+        "scaler": "credit_risk_scaler.pkl",
+    },
+}
+
+DEPTH_LIMITS = [8, 12, 16]
+LEAF_LIMITS = [1, 20]
+TREE_COUNTS = [10, 25, 50]
+DISTILL_SHAPES = [(25, 8), (50, 10)]  # (n_estimators, max_depth)
+
+def _features(name):
+    if name == "loan":
+        from train_model import features
+    else:
+        from train_credit_risk_model import features
+    return features
+
+# Regressor fitted on the teacher's P(class 1), exposed with the classifier
+# methods the API calls
+class DistilledForest:
+    def __init__(self, regressor, classes):
+        self.regressor = regressor
+        self.classes_ = np.asarray(classes)
+        self.estimators_ = regressor.estimators_
+
+    def predict_proba(self, X):
+        p = np.clip(self.regressor.predict(X), 0.0, 1.0)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] >= 0.5).astype(int)]
+
+def load_split(name, model_dir=MODEL_DIR):
+    # Rebuild the training script's split: scale with the saved scaler, 80/20
+    # with random_state=42. The test part is halved into a selection set (for
+    # tree subsets) and an evaluation set that only the report sees.
+    spec = MODELS[name]
+    features = _features(name)
+    df = pd.read_csv(spec["data"])
+    with open(os.path.join(model_dir, spec["scaler"]), 'rb') as f:
+        scaler = pickle.load(f)
+    X = pd.DataFrame(scaler.transform(df[features].astype('float64')), columns=features, index=df.index)
+    y = df[spec["target"]].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    X_sel, X_eval, y_sel, y_eval = train_test_split(X_test, y_test, test_size=0.5, random_state=42, stratify=y_test)
+    return X_train, y_train, X_sel, y_sel, X_eval, y_eval
+
+def model_bytes(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+def p99_latency_ms(model, X, n_calls=200):
+    # One row per call, the way the API scores a request
+    rows = X.iloc[np.random.default_rng(0).integers(0, len(X), n_calls)]
+    timings = []
+    for i in range(n_calls):
+        row = rows.iloc[i:i + 1]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.percentile(timings, 99) * 1000)
+
+def select_trees(forest, X_sel, y_sel, sizes):
+    # Greedy forward selection: repeatedly add the tree that most improves the
+    # AUC of the running average. Per-tree probabilities are computed once.
+    X_sel = X_sel.to_numpy()
+    probs = np.stack([tree.predict_proba(X_sel)[:, 1] for tree in forest.estimators_])
+    chosen, total = [], np.zeros(probs.shape[1])
+    remaining = list(range(len(probs)))
+    subsets = {}
+    for k in range(1, min(max(sizes), len(probs)) + 1):
+        gains = [roc_auc_score(y_sel, total + probs[i]) for i in remaining]
+        best = remaining.pop(int(np.argmax(gains)))
+        chosen.append(best)
+        total += probs[best]
+        if k in sizes:
+            subset = copy.copy(forest)
+            subset.estimators_ = [forest.estimators_[i] for i in chosen]
+            subset.n_estimators = k
+            subsets[k] = subset
+    return subsets
+
+def build_candidates(teacher, X_train, y_train, X_sel, y_sel):
+    candidates = {"original": teacher}
+    params = teacher.get_params()
+    for depth in DEPTH_LIMITS:
+        for leaf in LEAF_LIMITS:
+            model = RandomForestClassifier(**dict(params, max_depth=depth, min_samples_leaf=leaf, n_jobs=-1))
+            model.fit(X_train, y_train)
+            model.set_params(n_jobs=params["n_jobs"])
+            candidates[f"limit_depth{depth}_leaf{leaf}"] = model
+    for k, subset in select_trees(teacher, X_sel, y_sel, TREE_COUNTS).items():
+        candidates[f"subset_{k}"] = subset
+    soft_labels = teacher.predict_proba(X_train)[:, 1]
+    for n_estimators, depth in DISTILL_SHAPES:
+        student = RandomForestRegressor(n_estimators=n_estimators, max_depth=depth, random_state=42, n_jobs=-1)
+        student.fit(X_train, soft_labels)
+        student.set_params(n_jobs=None)
+        candidates[f"distill_{n_estimators}x{depth}"] = DistilledForest(student, teacher.classes_)
+    return candidates
+
+def pareto_frontier(results):
+    # A candidate is on the frontier unless another is at least as good on
+    # AUC, bytes and p99 and strictly better on one of them
+    def dominates(a, b):
+        at_least = a["roc_auc"] >= b["roc_auc"] and a["bytes"] <= b["bytes"] and a["p99_ms"] <= b["p99_ms"]
+        strictly = a["roc_auc"] > b["roc_auc"] or a["bytes"] < b["bytes"] or a["p99_ms"] < b["p99_ms"]
+        return at_least and strictly
+    return sorted((r["name"] for r in results if not any(dominates(o, r) for o in results)),
+                  key=lambda n: next(r["bytes"] for r in results if r["name"] == n))
+
+def compact(name, max_bytes=None, max_p99_ms=None, model_dir=MODEL_DIR, output=None):
+    with open(os.path.join(model_dir, MODELS[name]["model"]), 'rb') as f:
+        teacher = pickle.load(f)
+    X_train, y_train, X_sel, y_sel, X_eval, y_eval = load_split(name, model_dir)
+    candidates = build_candidates(teacher, X_train, y_train, X_sel, y_sel)
+
+    results = []
+    for cand_name, model in candidates.items():
+        results.append({
+            "name": cand_name,
+            "roc_auc": float(roc_auc_score(y_eval, model.predict_proba(X_eval)[:, 1])),
+            "bytes": model_bytes(model),
+            "p99_ms": p99_latency_ms(model, X_eval),
+            "n_trees": len(model.estimators_),
+        })
+        print(f"{cand_name}: AUC {results[-1]['roc_auc']:.4f}, {results[-1]['bytes'] / 1e6:.1f} MB, p99 {results[-1]['p99_ms']:.2f} ms")
+
+    frontier = pareto_frontier(results)
+    within = [r for r in results
+              if (max_bytes is None or r["bytes"] <= max_bytes) and (max_p99_ms is None or r["p99_ms"] <= max_p99_ms)]
+    selected = max(within, key=lambda r: r["roc_auc"]) if within else None
+    report = {"model": name, "max_bytes": max_bytes, "max_p99_ms": max_p99_ms,
+              "candidates": results, "pareto_frontier": frontier, "selected": selected and selected["name"]}
+
+    if selected is None:
+        print("No candidate fits the budget; nothing written")
+    else:
+        base, ext = os.path.splitext(MODELS[name]["model"])
+        output = output or os.path.join(model_dir, f"{base}_compact{ext}")
+        with open(output, 'wb') as f:
+            pickle.dump(candidates[selected["name"]], f, protocol=pickle.HIGHEST_PROTOCOL)
+        report["output"] = output
+        print(f"Selected {selected['name']} -> {output}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shrink a RandomForest model under a size or latency budget")
+    parser.add_argument("model", choices=list(MODELS))
+    parser.add_argument("--max-mb", type=float, default=None, help="Largest acceptable pickled size in MB")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="Largest acceptable p99 single-row latency")
+    parser.add_argument("--output", default=None, help="Where to write the selected model (default: <model>_compact.pkl)")
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    # Go through the importable module so a pickled DistilledForest refers to
+    # compact_forest.DistilledForest rather than __main__
+    from compact_forest import compact
+    max_bytes = int(args.max_mb * 1e6) if args.max_mb is not None else None
+    report = compact(args.model, max_bytes, args.max_p99_ms, output=args.output)
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Pareto frontier (AUC vs bytes vs p99): {', '.join(report['pareto_frontier'])}")
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+# Incremental runner for the credit-risk scripts. Each stage declares its
+# inputs, outputs and code; a stage is skipped when the hash of all three
+# matches its last successful run. Stages whose inputs are ready run in
+# parallel, and intermediate frames travel as pickled DataFrames, not CSV.
+
+PIPELINE_DIR = "data/pipeline"
+MODEL_DIR = "backend/model"
+RAW_PATH = "data/credit_risk_dataset.csv"
+CLEANED_CSV = "data/credit_risk_data_cleaned.csv"
+ENCODED_CSV = "data/credit_risk_data_encoded.csv"
+CLEANED_FRAME = os.path.join(PIPELINE_DIR, "credit_risk_data_cleaned.pkl")
+ENCODER_COLS = ["person_home_ownership", "loan_intent", "loan_grade", "cb_person_default_on_file"]
+
+def run_clean():
+    from clean_credit_risk_data import clean_credit_risk_data
+    df = clean_credit_risk_data(pd.read_csv(RAW_PATH))
+    df.to_pickle(CLEANED_FRAME)
+    df.to_csv(CLEANED_CSV, index=False)
+
+def run_encode():
+    from preprocess_credit_risk_data import encode_credit_risk_data
+    df, _ = encode_credit_risk_data(pd.read_pickle(CLEANED_FRAME), MODEL_DIR)
+    df.to_csv(ENCODED_CSV, index=False)
+
+def run_train():
+    from train_credit_risk_model import train_credit_risk_model, save_credit_risk_model
+    best_model, scaler, _ = train_credit_risk_model(pd.read_pickle(CLEANED_FRAME))
+    # The encode stage owns the label encoders; both fit them on the same frame
+    save_credit_risk_model(best_model, scaler, {}, MODEL_DIR)
+
+STAGES = {
+    "clean": {
+        "run": run_clean,
+        "inputs": [RAW_PATH],
+        "outputs": [CLEANED_FRAME, CLEANED_CSV],
+        "code": ["clean_credit_risk_data.py"],
+    },
+    "encode": {
+        "run": run_encode,
+        "inputs": [CLEANED_FRAME],
+        "outputs": [ENCODED_CSV] + [os.path.join(MODEL_DIR, f"le_{col}.pkl") for col in ENCODER_COLS],
+        "code": ["preprocess_credit_risk_data.py"],
+    },
+    "train": {
+        "run": run_train,
+        "inputs": [CLEANED_FRAME],
+        "outputs": [os.path.join(MODEL_DIR, "credit_risk_model.pkl"), os.path.join(MODEL_DIR, "credit_risk_scaler.pkl")],
+        "code": ["train_credit_risk_model.py"],
+    },
+}
+
+def _stamp_path(name):
+    return os.path.join(PIPELINE_DIR, f"{name}.stamp.json")
+
+def _read_stamp(name):
+    try:
+        with open(_stamp_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _file_digest(path, memo):
+    # Re-hash only when size or mtime changed since the digest was memoized
+    st = os.stat(path)
+    cached = memo.get(path)
+    if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+        return cached["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    memo[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+    return memo[path]["sha256"]
+
+def stage_hash(name, memo):
+    stage = STAGES[name]
+    h = hashlib.sha256(inspect.getsource(stage["run"]).encode())
+    for path in stage["code"] + stage["inputs"]:
+        h.update(path.encode())
+        h.update(_file_digest(path, memo).encode())
+    return h.hexdigest()
+
+def _outputs_intact(stamp, stage, memo):
+    # Outputs must exist and still be the files this stage wrote
+    for path in stage["outputs"]:
+        if not os.path.exists(path) or _file_digest(path, memo) != stamp.get("outputs", {}).get(path):
+            return False
+    return True
+
+def _upstream(name):
+    inputs = set(STAGES[name]["inputs"])
+    return {other for other, stage in STAGES.items() if other != name and inputs & set(stage["outputs"])}
+
+def run_pipeline(targets=None, force=False, workers=None):
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    # Selected stages plus everything they depend on
+    selected, frontier = set(), list(targets or STAGES)
+    while frontier:
+        name = frontier.pop()
+        if name not in selected:
+            selected.add(name)
+            frontier.extend(_upstream(name))
+
+    report = {}
+    done, running = set(), {}
+    with ProcessPoolExecutor(max_workers=workers or len(selected)) as pool:
+        while len(done) < len(selected):
+            for name in sorted(selected - done - set(running)):
+                if not _upstream(name) <= done:
+                    continue
+                stamp = _read_stamp(name)
+                memo = stamp.get("digests", {})
+                digest = stage_hash(name, memo)
+                if not force and stamp.get("hash") == digest and _outputs_intact(stamp, STAGES[name], memo):
+                    report[name] = {"status": "skipped", "seconds": 0.0}
+                    done.add(name)
+                    print(f"[{name}] up to date, skipped")
+                    continue
+                print(f"[{name}] running")
+                running[name] = (pool.submit(_timed, name), digest, memo)
+            if not running:
+                continue
+            finished, _ = wait([future for future, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name in [n for n, (future, _, _) in running.items() if future in finished]:
+                future, digest, memo = running.pop(name)
+                seconds = future.result()
+                outputs = {path: _file_digest(path, memo) for path in STAGES[name]["outputs"]}
+                with open(_stamp_path(name), "w") as f:
+                    json.dump({"hash": digest, "outputs": outputs, "digests": memo, "seconds": seconds}, f, indent=2)
+                report[name] = {"status": "ran", "seconds": seconds}
+                done.add(name)
+                print(f"[{name}] finished in {seconds:.2f}s")
+    return report
+
+def _timed(name):
+    start = time.perf_counter()
+    STAGES[name]["run"]()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the credit-risk data pipeline, skipping stages that are up to date")
+    parser.add_argument("stages", nargs="*", help=f"Stages to bring up to date: {', '.join(STAGES)} (default: all)")
+    parser.add_argument("--force", action="store_true", help="Rerun stages even if their inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    report = run_pipeline(args.stages or None, args.force, args.workers)
+    print(json.dumps(report, indent=2))
@@ -1,8 +1,16 @@
 import pandas as pd
-import requests
-from io import StringIO, BytesIO
-from bs4 import BeautifulSoup
-import re
+import numpy as np
+from pandas.io.parsers import TextFileReader
+from artifact_store import get_store
+import metrics
+import io
+import json
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
 # Map filenames (without path) to Google Drive file IDs
 CSV_FILE_IDS = {
     "credit_risk_data_cleaned.csv": "1tWeheLt8_O3hh_ob0Gjv0qVrkz1w-G32",
@@ -15,71 +23,176 @@ CSV_FILE_IDS = {
     "finbert_embeddings.npy":"1Qq3VQDRvB8lhrQopb7kkB3XTha9q3sYT"
 }
 
+# Columnar dataset cache: each CSV is converted once into per-column .npy files
+# and later loads are memory-mapped, reading only the requested columns.
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "data/cache")
+DATASET_CACHE_ENABLED = os.getenv("DATASET_CACHE", "1") != "0"
+# Opt-in: store integer columns in the smallest type that fits (int8/16/32), and
+# return them that way. Off by default so cached loads match pd.read_csv dtypes
+DATASET_CACHE_COMPACT_INTS = os.getenv("DATASET_CACHE_COMPACT_INTS", "0") == "1"
+CACHE_MANIFEST = "manifest.json"
+CACHE_FORMAT_VERSION = 2
+
 # Save the original pd.read_csv
 _original_read_csv = pd.read_csv
 
+def _download_csv(filename, *args, **kwargs):
+    # Served by the configured store chain (local dir -> HTTP mirror -> Drive).
+    # Hand pandas a text stream over the body: bytes are decoded incrementally
+    # as the parser pulls them, so nothing is buffered beyond the parser's window
+    body = get_store().open(filename)
+    stream = io.TextIOWrapper(body, encoding=kwargs.pop("encoding", None) or "utf-8", newline="")
+    try:
+        result = _original_read_csv(stream, *args, **kwargs)
+    except Exception:
+        stream.close()
+        raise
+    if not isinstance(result, TextFileReader):
+        stream.close()
+        return result
+
+    # chunksize/iterator: keep the connection open until the reader is exhausted or closed
+    _close_reader = result.close
+    def close():
+        _close_reader()
+        stream.close()
+    result.close = close
+    return result
+
+def _cache_path(filename):
+    return os.path.join(DATASET_CACHE_DIR, os.path.splitext(filename)[0])
+
+def _int_dtype(values):
+    # Smallest signed integer type that holds every value
+    lo, hi = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+def _category_value(value):
+    # JSON keeps str/int/float/bool as they are, so object columns read back
+    # with their original values; anything else is stored as its str()
+    value = value.item() if isinstance(value, np.generic) else value
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+def _encode_column(series, compact_ints=False):
+    # Returns (array, column spec). Floats are stored as float32; integers keep
+    # their dtype unless compact_ints is set
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=np.int8), {"kind": "bool"}
+    if pd.api.types.is_integer_dtype(series):
+        values = series.to_numpy()
+        return (values.astype(_int_dtype(values)) if compact_ints else values), {"kind": "int"}
+    if pd.api.types.is_float_dtype(series):
+        return series.to_numpy(dtype=np.float32), {"kind": "float"}
+    # Codes are internal to the cache; reads map them back to the original objects
+    categorical = pd.Categorical(series)
+    codes = categorical.codes
+    categories = [_category_value(c) for c in categorical.categories]
+    return codes.astype(_int_dtype(codes)), {"kind": "category", "categories": categories}
+
+def write_dataset_cache(filename, df, compact_ints=None):
+    compact_ints = DATASET_CACHE_COMPACT_INTS if compact_ints is None else compact_ints
+    path = _cache_path(filename)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values, spec = _encode_column(df[name], compact_ints)
+        spec.update({"name": str(name), "file": f"c{i:03d}.npy", "dtype": values.dtype.str})
+        np.save(os.path.join(tmp_path, spec["file"]), np.ascontiguousarray(values))
+        columns.append(spec)
+    manifest = {
+        "version": CACHE_FORMAT_VERSION,
+        "source_id": CSV_FILE_IDS.get(filename),
+        "compact_ints": bool(compact_ints),
+        "rows": int(len(df)),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_path, CACHE_MANIFEST), "w") as f:
+        json.dump(manifest, f)
+    # Swap the finished directory in so readers never see a partial cache
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Cached {filename} as {len(columns)} columns in {path}")
+
+def _read_manifest(filename):
+    manifest_path = os.path.join(_cache_path(filename), CACHE_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_FORMAT_VERSION or manifest.get("source_id") != CSV_FILE_IDS.get(filename):
+        return None
+    # A cache written with the other integer setting is rebuilt, not returned with the wrong dtypes
+    if manifest.get("compact_ints") != DATASET_CACHE_COMPACT_INTS:
+        return None
+    return manifest
+
+def _select_columns(columns, usecols):
+    if usecols is None:
+        return columns
+    if callable(usecols):
+        return [c for c in columns if usecols(c["name"])]
+    usecols = list(usecols)
+    if all(isinstance(c, (int, np.integer)) for c in usecols):
+        wanted = {columns[int(i)]["name"] for i in usecols}
+    else:
+        wanted = set(usecols)
+        missing = wanted - {c["name"] for c in columns}
+        if missing:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {sorted(missing)}")
+    # Like pandas, projected columns keep file order
+    return [c for c in columns if c["name"] in wanted]
+
+def read_dataset_cache(filename, usecols=None):
+    manifest = _read_manifest(filename)
+    if manifest is None:
+        return None
+    path = _cache_path(filename)
+    data = {}
+    for spec in _select_columns(manifest["columns"], usecols):
+        # Copy-on-write mapping: pages are read lazily and never written back
+        values = np.load(os.path.join(path, spec["file"]), mmap_mode="c")
+        if spec["kind"] == "bool":
+            values = values.astype(bool)
+        elif spec["kind"] == "category":
+            categories = pd.Index(spec["categories"], dtype=object)
+            values = pd.Categorical.from_codes(values, categories).astype(object)
+        data[spec["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
 def read_csv(filepath_or_buffer, *args, **kwargs):
-    import os
+    if not isinstance(filepath_or_buffer, (str, os.PathLike)):
+        return _original_read_csv(filepath_or_buffer, *args, **kwargs)
 
     filename = os.path.basename(filepath_or_buffer)
 
     # If file is in the map, load from Google Drive
     if filename in CSV_FILE_IDS:
-        file_id = CSV_FILE_IDS[filename]
-        base_url = "https://drive.google.com/uc"
-        session = requests.Session()
-        params = {
-            "export": "download",
-            "id": file_id
-        }
-        response = session.get(base_url, params=params, stream=True)
-
-        # Check if response is HTML (likely a virus scan warning)
-        if "content-disposition" not in response.headers:
-            token = None
-            for k, v in response.cookies.items():
-                if k.startswith("download_warning"):
-                    token = v
-                    break
-
-            if not token:
-                soup = BeautifulSoup(response.text, "html.parser")
-                download_form = soup.find("form", {"id": "download-form"})
-                if download_form and download_form.get("action"):
-                    download_url = download_form["action"]
-                    form_params = {}
-                    for inp in download_form.find_all("input", {"type": "hidden"}):
-                        if inp.get("name") and inp.get("value") is not None:
-                            form_params[inp["name"]] = inp["value"]
-                    response = session.get(download_url, params=form_params, stream=True)
-                else:
-                    match = re.search(r'confirm=([0-9A-Za-z-_]+)', response.text)
-                    if match:
-                        token = match.group(1)
-                        params["confirm"] = token
-                        response = session.get(base_url, params=params, stream=True)
-                    else:
-                        raise Exception(f"Unable to find download confirmation token or form for {filename}. Ensure the file is shared publicly with 'Anyone with the link'.")
-
-            else:
-                params["confirm"] = token
-                response = session.get(base_url, params=params, stream=True)
-
-        if response.status_code != 200:
-            raise ValueError(f"Failed to download {filename}: {response.status_code} - {response.text}")
-
-        # Use BytesIO to accumulate binary chunks
-        file_content = BytesIO()
-        for chunk in response.iter_content(chunk_size=32768):
-            if chunk:
-                file_content.write(chunk)
-        file_content.seek(0)
-        # Decode the entire content to string and pass to StringIO
-        content = file_content.getvalue().decode('utf-8')
-        return _original_read_csv(StringIO(content), *args, **kwargs)
+        # Only plain (optionally column-projected) loads go through the cache
+        cacheable = DATASET_CACHE_ENABLED and filename.endswith(".csv") and not args and set(kwargs) <= {"usecols"}
+        if cacheable:
+            usecols = kwargs.get("usecols")
+            df = read_dataset_cache(filename, usecols)
+            metrics.cache_lookup("dataset", df is not None)
+            if df is not None:
+                return df
+            df = _download_csv(filename)
+            try:
+                write_dataset_cache(filename, df)
+            except OSError as e:
+                logger.warning(f"Could not write dataset cache for {filename}: {e}")
+                return df if usecols is None else df[[c["name"] for c in _select_columns([{"name": c} for c in df.columns], usecols)]]
+            return read_dataset_cache(filename, usecols)
+        return _download_csv(filename, *args, **kwargs)
 
     # Otherwise, load normally
     return _original_read_csv(filepath_or_buffer, *args, **kwargs)
 
 # Replace pandas read_csv with our version
-pd.read_csv = read_csv
\ No newline at end of file
+pd.read_csv = read_csv
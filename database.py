@@ -8,7 +8,6 @@ from dotenv import load_dotenv
 import logging
 import asyncio
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -21,7 +20,8 @@ if not DATABASE_URL:
 # Create async engine with connection timeout and pool settings
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    # SQL statements: LOG_LEVELS=sqlalchemy.engine=INFO
+    echo=False,
     connect_args={"timeout": 10},
     pool_size=5,
     max_overflow=10
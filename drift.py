@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from artifact_store import get_store
+from feature_schema import FRAUD_COLUMNS
+from preprocessing import CATEGORICAL_MAPPINGS
+
+logger = logging.getLogger(__name__)
+
+# Feature drift on live prediction traffic, in fixed memory. Each scored
+# input adds one count per feature to a histogram. Numeric features use the
+# training data's deciles as bin edges, with open-ended outer bins.
+# Categorical features get one bin per training category, plus one for
+# anything else. Recording a request costs one binary search per numeric
+# feature and one dict lookup per categorical one, a few microseconds in all.
+# Batches are binned with numpy. No payload is stored.
+#
+# Counts are kept per time window (DRIFT_WINDOW_SECONDS). Each worker
+# writes its window to DRIFT_DIR/<window>-<pid>.json every
+# DRIFT_FLUSH_SECONDS. /drift/ sums the files, since histograms merge by
+# addition, and compares the result with the reference histograms using PSI.
+# The reference is built from the training CSVs with `python drift.py` and
+# served like any other artifact (drift_reference.json).
+
+DRIFT_DIR = os.getenv("DRIFT_DIR", "data/drift")
+DRIFT_WINDOW_SECONDS = int(os.getenv("DRIFT_WINDOW_SECONDS", "3600"))
+DRIFT_FLUSH_SECONDS = float(os.getenv("DRIFT_FLUSH_SECONDS", "30"))
+DRIFT_RETENTION_WINDOWS = int(os.getenv("DRIFT_RETENTION_WINDOWS", "48"))
+DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", "100"))
+REFERENCE_FILE = "drift_reference.json"
+BINS = 10
+PSI_EPSILON = 1e-4
+# Conventional PSI bands: below 0.1 stable, up to 0.25 moderate shift, above that significant
+PSI_MODERATE, PSI_SIGNIFICANT = 0.1, 0.25
+
+# Training data and input columns of each monitored model
+DRIFT_MODELS = {
+    "loan": {
+        "data": "loan_data.csv",
+        "numeric": ['Age', 'Income', 'LoanAmount', 'CreditScore', 'MonthsEmployed',
+                    'NumCreditLines', 'InterestRate', 'LoanTerm', 'DTIRatio'],
+        "categorical": ['Education', 'EmploymentType', 'MaritalStatus', 'HasMortgage',
+                        'HasDependents', 'LoanPurpose', 'HasCoSigner'],
+        # loan_data.csv holds these as the integer codes preprocessing maps requests to
+        "encodings": CATEGORICAL_MAPPINGS,
+    },
+    "credit_risk": {
+        "data": "credit_risk_data_cleaned.csv",
+        "numeric": ['person_age', 'person_income', 'person_emp_length', 'loan_amnt',
+                    'loan_int_rate', 'loan_percent_income', 'cb_person_cred_hist_length'],
+        "categorical": ['person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file'],
+        "encodings": {},
+    },
+    "fraud": {"data": "creditcard.csv", "numeric": FRAUD_COLUMNS, "categorical": [], "encodings": {}},
+}
+
+def _category(value):
+    if isinstance(value, (int, float, np.integer, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value).lower().strip()
+
+def build_reference(data_dir, models=DRIFT_MODELS):
+    import pandas as pd  # Only the offline builder reads CSVs
+    reference = {"bins": BINS, "models": {}}
+    for name, spec in models.items():
+        df = pd.read_csv(os.path.join(data_dir, spec["data"]), usecols=spec["numeric"] + spec["categorical"])
+        numeric_edges, categories = [], []
+        for col in spec["numeric"]:
+            values = df[col].dropna().to_numpy(dtype=np.float64)
+            # Repeated deciles (discrete columns such as LoanTerm) collapse into fewer bins
+            numeric_edges.append(np.unique(np.quantile(values, np.linspace(0, 1, BINS + 1)[1:-1])).tolist())
+        for col in spec["categorical"]:
+            categories.append(sorted(df[col].dropna().map(_category).unique().tolist()))
+        sketch = ModelSketch(name, spec, numeric_edges, categories)
+        sketch.observe_arrays(df[spec["numeric"]].to_numpy(dtype=np.float64),
+                              df[spec["categorical"]].itertuples(index=False))
+        reference["models"][name] = {
+            "rows": int(len(df)),
+            "numeric": {"features": spec["numeric"], "edges": numeric_edges, "counts": sketch.numeric},
+            "categorical": {"features": spec["categorical"], "categories": categories, "counts": sketch.categorical},
+        }
+        logger.info(f"Reference for {name}: {len(df)} rows from {spec['data']}")
+    return reference
+
+class ModelSketch:
+    def __init__(self, name, spec, numeric_edges, categories):
+        self.name = name
+        self.spec = spec
+        self.edges = [list(e) for e in numeric_edges]
+        # Plain lists: one bisect and one int increment per feature beats numpy's per-call overhead on a single row
+        self.numeric = [[0] * (len(e) + 1) for e in self.edges]
+        self.categorical = [[0] * (len(c) + 1) for c in categories]
+        self.category_index = []
+        for feature, cats in zip(spec["categorical"], categories):
+            index = {c: j for j, c in enumerate(cats)}
+            # Request values ("full-time") resolve straight to the bin of their training code ("0")
+            for label, code in spec["encodings"].get(feature, {}).items():
+                if str(code) in index:
+                    index[label] = index[str(code)]
+            self.category_index.append(index)
+        self.rows = 0
+        self._numeric_plan = list(zip(spec["numeric"], self.edges, self.numeric))
+        self._categorical_plan = [(feature, index, counts, len(counts) - 1)
+                                  for feature, index, counts in zip(spec["categorical"], self.category_index, self.categorical)]
+
+    def observe_record(self, record):
+        for feature, edges, counts in self._numeric_plan:
+            counts[bisect_right(edges, record[feature])] += 1
+        for feature, index, counts, other in self._categorical_plan:
+            value = record[feature]
+            j = index.get(value)
+            counts[index.get(_category(value), other) if j is None else j] += 1
+        self.rows += 1
+
+    def observe_row(self, values):
+        # Numeric-only models, values in spec order
+        for (_, edges, counts), value in zip(self._numeric_plan, values):
+            counts[bisect_right(edges, value)] += 1
+        self.rows += 1
+
+    def observe_records(self, records):
+        for record in records:
+            self.observe_record(record)
+
+    def observe_arrays(self, numeric, categorical=()):
+        # numeric: (rows, numeric features) in spec order; categorical: one sequence of values per row
+        for i, (edges, counts) in enumerate(zip(self.edges, self.numeric)):
+            batch = np.bincount(np.searchsorted(edges, numeric[:, i], side="right"), minlength=len(counts))
+            counts[:] = [a + b for a, b in zip(counts, batch.tolist())]
+        for row in categorical:
+            for (_, index, counts, other), value in zip(self._categorical_plan, row):
+                counts[index.get(_category(value), other)] += 1
+        self.rows += len(numeric)
+
+    def counts(self):
+        return {"rows": self.rows, "numeric": [list(c) for c in self.numeric],
+                "categorical": [list(c) for c in self.categorical]}
+
+    def add(self, counts):
+        self.rows += counts["rows"]
+        for mine, theirs in zip(self.numeric + self.categorical, counts["numeric"] + counts["categorical"]):
+            mine[:] = [a + b for a, b in zip(mine, theirs)]
+
+def psi(live, reference):
+    live, reference = np.asarray(live, dtype=np.float64), np.asarray(reference, dtype=np.float64)
+    p = (live + PSI_EPSILON) / (live.sum() + PSI_EPSILON * len(live))
+    q = (reference + PSI_EPSILON) / (reference.sum() + PSI_EPSILON * len(reference))
+    return float(np.sum((p - q) * np.log(p / q)))
+
+def _status(value):
+    return "significant" if value > PSI_SIGNIFICANT else "moderate" if value > PSI_MODERATE else "stable"
+
+class DriftMonitor:
+    def __init__(self, directory=DRIFT_DIR, window_seconds=DRIFT_WINDOW_SECONDS):
+        self.directory = directory
+        self.window_seconds = window_seconds
+        self.reference = None
+        self.reference_id = None
+        self.window = None
+        self.sketches = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _new_sketches(self):
+        return {name: ModelSketch(name, DRIFT_MODELS[name], ref["numeric"]["edges"], ref["categorical"]["categories"])
+                for name, ref in self.reference["models"].items() if name in DRIFT_MODELS}
+
+    def set_reference(self, reference):
+        # Workers only merge counts built against the same reference layout
+        self.reference_id = hashlib.sha1(json.dumps(reference, sort_keys=True).encode()).hexdigest()[:12]
+        with self._lock:
+            self.reference = reference
+            self.window = self._current_window()
+            self.sketches = self._new_sketches()
+
+    def load_reference(self):
+        try:
+            with get_store().open(REFERENCE_FILE) as f:
+                self.set_reference(json.load(f))
+            logger.info(f"Drift reference {self.reference_id} loaded for {sorted(self.sketches)}")
+        except Exception as e:
+            logger.warning(f"Drift monitoring disabled, no usable {REFERENCE_FILE}: {e}")
+
+    def _current_window(self):
+        return int(time.time() // self.window_seconds)
+
+    def _roll(self):
+        # Called with the lock held; the finished window is written before counting restarts
+        window = self._current_window()
+        if window != self.window:
+            self._write(self.window, {name: s.counts() for name, s in self.sketches.items()})
+            self.window = window
+            self.sketches = self._new_sketches()
+
+    def observe(self, name, records):
+        # records: request dicts; a no-op until the reference is loaded
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            return
+        with self._lock:
+            self._roll()
+            self.sketches[name].observe_records(records)
+
+    def observe_array(self, name, X):
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            return
+        with self._lock:
+            self._roll()
+            if len(X) == 1:
+                self.sketches[name].observe_row(np.asarray(X[0]).tolist())
+            else:
+                self.sketches[name].observe_arrays(np.asarray(X, dtype=np.float64))
+
+    def _path(self, window, pid):
+        return os.path.join(self.directory, f"{window}-{pid}.json")
+
+    def _write(self, window, counts):
+        if window is None or not any(c["rows"] for c in counts.values()):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(window, os.getpid())
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"reference": self.reference_id, "window": window, "models": counts}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def flush(self):
+        with self._lock:
+            if self.reference is None:
+                return
+            self._roll()
+            window, counts = self.window, {name: s.counts() for name, s in self.sketches.items()}
+        # Written outside the lock from a snapshot of the counts
+        self._write(window, counts)
+        for path in glob.glob(os.path.join(self.directory, "*-*.json")):
+            expired = _window_of(path)
+            if expired is not None and expired <= window - DRIFT_RETENTION_WINDOWS:
+                os.remove(path)
+
+    def merged(self, windows=1):
+        # Sum of every worker's counts for the last `windows` windows, this worker's from memory
+        with self._lock:
+            self._roll()
+            current = self.window
+            merged = self._new_sketches()
+            for name, sketch in self.sketches.items():
+                merged[name].add(sketch.counts())
+        own = os.path.basename(self._path(current, os.getpid()))
+        for path in glob.glob(os.path.join(self.directory, "*-*.json")):
+            window = _window_of(path)
+            if window is None or window <= current - windows or os.path.basename(path) == own:
+                continue
+            try:
+                with open(path) as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if payload.get("reference") != self.reference_id:
+                continue
+            for name, counts in payload["models"].items():
+                if name in merged:
+                    merged[name].add(counts)
+        return merged
+
+    def report(self, windows=1):
+        if self.reference is None:
+            return None
+        result = {"reference": self.reference_id, "window_seconds": self.window_seconds, "windows": windows, "models": {}}
+        for name, sketch in self.merged(windows).items():
+            ref = self.reference["models"][name]
+            features = {}
+            for i, feature in enumerate(ref["numeric"]["features"]):
+                features[feature] = psi(sketch.numeric[i], ref["numeric"]["counts"][i])
+            for i, feature in enumerate(ref["categorical"]["features"]):
+                features[feature] = psi(sketch.categorical[i], ref["categorical"]["counts"][i])
+            enough = sketch.rows >= DRIFT_MIN_SAMPLES
+            ranked = sorted(features.items(), key=lambda item: -item[1])
+            result["models"][name] = {
+                "rows": sketch.rows,
+                "status": (_status(ranked[0][1]) if ranked else "stable") if enough else "insufficient_data",
+                "features": {feature: {"psi": round(value, 4), "status": _status(value) if enough else "insufficient_data"}
+                             for feature, value in ranked},
+            }
+        return result
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(DRIFT_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.warning(f"Could not write drift sketches: {e}")
+
+    async def start(self):
+        # Reference download happens off the event loop; requests are not sketched until it is in
+        await asyncio.to_thread(self.load_reference)
+        if self.reference is not None and self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+            atexit.register(self.flush)
+
+def _window_of(path):
+    try:
+        return int(os.path.basename(path).split("-", 1)[0])
+    except ValueError:
+        return None
+
+monitor = DriftMonitor()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build drift reference histograms from the training data")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output", default=os.path.join("backend/model", REFERENCE_FILE))
+    parser.add_argument("--models", nargs="+", default=list(DRIFT_MODELS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for name in args.models:
+        if name not in DRIFT_MODELS:
+            parser.error(f"unknown model {name}; choose from {list(DRIFT_MODELS)}")
+    reference = build_reference(args.data_dir, {name: DRIFT_MODELS[name] for name in args.models})
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(reference, f)
+    print(f"Wrote {args.output}")
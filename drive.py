@@ -0,0 +1,49 @@
+import os
+import re
+from bs4 import BeautifulSoup
+
+# Base URL of the Drive download endpoint; point it at a local server to test offline
+DRIVE_URL = os.getenv("DRIVE_URL", "https://drive.google.com/uc")
+# Directory holding complete local copies of artifacts and datasets (see prefetch.py)
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "data/artifacts")
+
+def drive_response(session, file_id, file_name, headers=None, base_url=None):
+    base_url = base_url or DRIVE_URL
+    params = {
+        "export": "download",
+        "id": file_id
+    }
+    response = session.get(base_url, params=params, headers=headers, stream=True)
+
+    # If no Content-Disposition, it's likely the warning page - handle confirmation.
+    # Only a 200 can be that page; 206/416 answers to a Range request go back to the caller
+    if response.status_code == 200 and "content-disposition" not in response.headers:
+        token = None
+        for k, v in response.cookies.items():
+            if k.startswith("download_warning"):
+                token = v
+                break
+
+        if not token:
+            soup = BeautifulSoup(response.text, "html.parser")
+            download_form = soup.find("form", {"id": "download-form"})
+            if download_form and download_form.get("action"):
+                download_url = download_form["action"]
+                form_params = {}
+                for inp in download_form.find_all("input", {"type": "hidden"}):
+                    if inp.get("name") and inp.get("value") is not None:
+                        form_params[inp["name"]] = inp["value"]
+                response = session.get(download_url, params=form_params, headers=headers, stream=True)
+            else:
+                match = re.search(r'confirm=([0-9A-Za-z-_]+)', response.text)
+                if match:
+                    token = match.group(1)
+                    params["confirm"] = token
+                    response = session.get(base_url, params=params, headers=headers, stream=True)
+                else:
+                    raise Exception(f"Unable to find download confirmation token or form for {file_name}. Ensure the file is shared publicly with 'Anyone with the link'.")
+        else:
+            params["confirm"] = token
+            response = session.get(base_url, params=params, headers=headers, stream=True)
+
+    return response
@@ -0,0 +1,125 @@
+import glob
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/finbert_embedding_cache.npz")
+
+def normalize_text(text):
+    # Embeddings are keyed on lowercased, whitespace-collapsed text
+    return " ".join(str(text).lower().split())
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    # Persistent text-hash -> embedding map. Vectors are tied to the model that
+    # produced them; a store written by another model is ignored on load.
+    # append() writes only the vectors added since the last write, as a shard
+    # next to the main file, so checkpointing a long run is not quadratic;
+    # save() folds everything back into the main file.
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model_name=None):
+        self.path = path
+        self.model_name = model_name
+        self.shard_dir = f"{path}.shards"
+        self._vectors = {}
+        self._unwritten = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _read(self, path):
+        with np.load(path, allow_pickle=False) as data:
+            stored_model = str(data["model"]) if "model" in data else None
+            if self.model_name and stored_model != self.model_name:
+                logger.warning(f"Ignoring embedding cache {path}: built with {stored_model}, not {self.model_name}")
+                return 0
+            keys, vectors = data["keys"], data["vectors"]
+        with self._lock:
+            self._vectors.update(zip((k.decode() if isinstance(k, bytes) else str(k) for k in keys), vectors))
+        return len(keys)
+
+    def _shards(self):
+        return sorted(glob.glob(os.path.join(self.shard_dir, "*.npz")))
+
+    def load(self):
+        shards = self._shards()
+        paths = ([self.path] if os.path.exists(self.path) else []) + shards
+        if not paths:
+            return self
+        loaded = sum(self._read(path) for path in paths)
+        logger.info(f"Loaded {loaded} cached embeddings from {self.path} and {len(shards)} shards")
+        return self
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, key):
+        return key in self._vectors
+
+    def get(self, key):
+        return self._vectors.get(key)
+
+    def keys(self):
+        return list(self._vectors)
+
+    def put_many(self, keys, vectors):
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._vectors[key] = self._unwritten[key] = np.asarray(vector, dtype=np.float32)
+            self._dirty = True
+
+    def _write(self, path, vectors_by_key):
+        keys = np.array(list(vectors_by_key), dtype="S40")
+        vectors = np.stack(list(vectors_by_key.values())) if vectors_by_key else np.empty((0, 0), dtype=np.float32)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Through a file object so savez keeps the name: a leftover .tmp never looks like a shard
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, vectors=vectors, model=np.array(self.model_name or ""))
+        os.replace(tmp_path, path)
+
+    def append(self):
+        # Cost proportional to the new vectors only
+        with self._lock:
+            if not self._unwritten:
+                return
+            unwritten, self._unwritten = self._unwritten, {}
+        self._write(os.path.join(self.shard_dir, f"{time.time_ns()}-{os.getpid()}.npz"), unwritten)
+
+    def save(self):
+        shards = self._shards()
+        with self._lock:
+            if not self._dirty and not shards:
+                return
+            snapshot = dict(self._vectors)
+            self._unwritten = {}
+            self._dirty = False
+        self._write(self.path, snapshot)
+        # Every shard's vectors are in the main file now
+        for shard in shards:
+            os.remove(shard)
+
+def deduplicate(texts):
+    # Returns (distinct normalized texts, their hash keys, row -> distinct index)
+    normalized = [normalize_text(t) for t in texts]
+    uniques, codes = np.unique(np.array(normalized, dtype=object), return_inverse=True)
+    return list(uniques), [text_key(u) for u in uniques], codes.reshape(-1)
+
+def embed_deduplicated(texts, embed_fn, store=None):
+    # Embed each distinct normalized text once (skipping ones already in the
+    # store) and scatter the vectors back to every row that shares it
+    uniques, keys, codes = deduplicate(texts)
+    store = store if store is not None else EmbeddingStore()
+    missing = [i for i, key in enumerate(keys) if key not in store]
+    logger.info(f"{len(texts)} texts, {len(uniques)} unique, {len(missing)} not cached")
+    if missing:
+        vectors = embed_fn([uniques[i] for i in missing])
+        store.put_many([keys[i] for i in missing], vectors)
+    unique_vectors = np.stack([store.get(key) for key in keys])
+    return unique_vectors[codes]
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from singleflight import SingleFlight
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# SHAP attributions for the loan and credit-risk forests. A TreeExplainer is
+# built once per model version, where the version is a fingerprint of the
+# trees, so a retrained or compacted model gets a fresh explainer and an
+# unchanged reload reuses the old one. A batch is explained in one
+# shap_values call. Attributions are cached per scaled input row.
+#
+# Exact tree SHAP on a deep forest costs hundreds of milliseconds per row.
+# "approximate" uses Saabas attributions, which are orders of magnitude
+# cheaper. "auto" picks exact when the expected time, measured per
+# explainer, fits in the request's budget. Values are in the model's output
+# space, P(class 1), and sum with base_value to the predicted probability.
+
+EXPLAIN_CACHE_SIZE = int(os.getenv("EXPLAIN_CACHE_SIZE", "4096"))
+EXPLAIN_BUDGET_MS = float(os.getenv("EXPLAIN_BUDGET_MS", "250"))
+MODES = ("auto", "exact", "approximate")
+
+_fingerprints = weakref.WeakKeyDictionary()
+
+def model_fingerprint(model):
+    # Hashing the split arrays takes tens of ms on a large forest, so it is memoized per loaded object
+    try:
+        return _fingerprints[model]
+    except KeyError:
+        pass
+    digest = hashlib.blake2b(digest_size=12)
+    for estimator in model.estimators_:
+        digest.update(estimator.tree_.feature.tobytes())
+        digest.update(estimator.tree_.threshold.tobytes())
+        digest.update(estimator.tree_.value.tobytes())
+    fingerprint = digest.hexdigest()
+    _fingerprints[model] = fingerprint
+    return fingerprint
+
+class ExplanationCache:
+    def __init__(self, maxsize=EXPLAIN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_approximate):
+        with self._lock:
+            entry = self._data.get(key)
+            # An exact entry answers any mode; an approximate one only non-exact requests
+            if entry is not None and entry[0] == "approximate" and not allow_approximate:
+                entry = None
+            metrics.cache_lookup("explanations", entry is not None)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def put(self, key, method, values):
+        with self._lock:
+            self._data[key] = (method, values)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+class ForestExplainer:
+    def __init__(self, model, n_features):
+        import shap  # Heavy import, only paid by processes that explain
+        # DistilledForest (compact_forest.py) is a regressor predicting P(class 1) directly
+        self.target = getattr(model, "regressor", model)
+        self.explainer = shap.TreeExplainer(self.target)
+        self.base_value = float(np.ravel(self.explainer.expected_value)[-1])
+        self.seconds_per_row = {}
+        # One row of zeros (the scaled mean) gives each method a first cost estimate
+        probe = np.zeros((1, n_features))
+        for method in ("approximate", "exact"):
+            self.shap_values(probe, method)
+
+    def shap_values(self, X, method):
+        start = time.perf_counter()
+        values = self.explainer.shap_values(X, approximate=method == "approximate", check_additivity=False)
+        # Classifiers give (rows, features, classes) or a per-class list; keep class 1
+        if isinstance(values, list):
+            values = values[-1]
+        elif values.ndim == 3:
+            values = values[:, :, -1]
+        per_row = (time.perf_counter() - start) / len(X)
+        previous = self.seconds_per_row.get(method)
+        self.seconds_per_row[method] = per_row if previous is None else 0.8 * previous + 0.2 * per_row
+        return values
+
+    def choose(self, mode, rows, budget_ms):
+        if mode != "auto":
+            return mode
+        return "exact" if self.seconds_per_row["exact"] * rows * 1000 <= budget_ms else "approximate"
+
+class Explanations:
+    def __init__(self, cache=None):
+        self.cache = cache or ExplanationCache()
+        self._explainers = {}
+        self._builds = SingleFlight("explainers")
+
+    def _build(self, name, version, model, n_features):
+        explainer = self._explainers.get((name, version))
+        if explainer is None:
+            start = time.perf_counter()
+            explainer = ForestExplainer(model, n_features)
+            # Older versions of the same model are dropped
+            self._explainers = {k: v for k, v in self._explainers.items() if k[0] != name}
+            self._explainers[(name, version)] = explainer
+            logger.info(f"Built TreeExplainer for {name} {version} in {time.perf_counter() - start:.2f}s")
+        return explainer
+
+    def _attributions(self, name, version, explainer, X, mode, budget_ms):
+        keys = [(name, version, row.tobytes()) for row in X]
+        entries = [self.cache.get(key, allow_approximate=mode != "exact") for key in keys]
+        misses = [i for i, entry in enumerate(entries) if entry is None]
+        if misses:
+            method = explainer.choose(mode, len(misses), budget_ms)
+            start = time.perf_counter()
+            values = explainer.shap_values(X[misses], method)
+            metrics.EXPLAIN_SECONDS.labels(name, method).inc(time.perf_counter() - start)
+            metrics.EXPLAIN_ROWS.labels(name, method).inc(len(misses))
+            for i, row_values in zip(misses, values):
+                entries[i] = (method, row_values)
+                self.cache.put(keys[i], method, row_values)
+        return entries
+
+    async def explain(self, name, model, X, feature_names, mode="auto", budget_ms=None, top_k=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        budget_ms = EXPLAIN_BUDGET_MS if budget_ms is None else budget_ms
+        version = await asyncio.to_thread(model_fingerprint, model)
+        explainer = self._explainers.get((name, version))
+        if explainer is None:
+            # Concurrent requests for a new model version share one build
+            explainer = await self._builds.do_async((name, version), self._build, name, version, model, X.shape[1])
+        entries = await asyncio.to_thread(self._attributions, name, version, explainer, X, mode, budget_ms)
+        probabilities = model.predict_proba(X)[:, 1]
+        explanations = []
+        for probability, (method, values) in zip(probabilities, entries):
+            order = np.argsort(-np.abs(values))[:top_k]
+            explanations.append({
+                "probability": float(probability),
+                "method": method,
+                "contributions": {feature_names[j]: float(values[j]) for j in order},
+            })
+        return {"model_version": version, "base_value": explainer.base_value, "explanations": explanations}
+
+    def stats(self):
+        return {
+            "explainers": {f"{name}:{version}": {m: s * 1000 for m, s in e.seconds_per_row.items()}
+                           for (name, version), e in self._explainers.items()},
+            "cached_rows": len(self.cache),
+        }
+
+explanations = Explanations()
@@ -0,0 +1,123 @@
+import json
+
+import numpy as np
+
+# Compact batch formats for numeric scoring endpoints. A batch arrives either as
+# columnar JSON, {"features": [[...], ...]} with one positional row per
+# transaction, or as a raw body of little-endian float32 values, row after row,
+# sent with Content-Type: application/octet-stream and X-Feature-Schema naming
+# the schema. Both are read straight into one (rows, columns) array and checked
+# with whole-array comparisons instead of a pydantic object per row.
+
+BINARY_CONTENT_TYPE = "application/octet-stream"
+BINARY_DTYPE = np.dtype("<f4")
+MAX_REPORTED_ERRORS = 10
+# Allowance per value for the JSON body limit: a float32 printed in full plus separators
+MAX_JSON_BYTES_PER_VALUE = 32
+
+class SchemaError(ValueError):
+    # Raised with the HTTP status the endpoint should answer with
+    def __init__(self, message, status_code=422):
+        super().__init__(message)
+        self.status_code = status_code
+
+class FeatureSchema:
+    def __init__(self, name, columns, bounds=None, max_rows=10000):
+        self.name = name
+        self.columns = list(columns)
+        bounds = bounds or {}
+        self.lower = np.array([bounds.get(c, (-np.inf, np.inf))[0] for c in self.columns], dtype=np.float32)
+        self.upper = np.array([bounds.get(c, (-np.inf, np.inf))[1] for c in self.columns], dtype=np.float32)
+        self.max_rows = max_rows
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "columns": self.columns,
+            "dtype": "float32",
+            "byte_order": "little",
+            "row_bytes": len(self.columns) * BINARY_DTYPE.itemsize,
+            "bounds": {c: [_json_bound(lo), _json_bound(hi)]
+                       for c, lo, hi in zip(self.columns, self.lower, self.upper) if np.isfinite([lo, hi]).any()},
+            "max_rows": self.max_rows,
+        }
+
+    def parse_columnar(self, body):
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise SchemaError(f"Invalid JSON: {e}")
+        if not isinstance(payload, dict) or "features" not in payload:
+            raise SchemaError('Expected {"features": [[...], ...]}')
+        # Optional, but when sent it must match so a reordered client fails loudly
+        columns = payload.get("columns")
+        if columns is not None and list(columns) != self.columns:
+            raise SchemaError(f"columns must be exactly {self.columns} in that order")
+        try:
+            X = np.asarray(payload["features"], dtype=np.float32)
+        except (TypeError, ValueError):
+            raise SchemaError(f"features must be a list of rows of {len(self.columns)} numbers")
+        if X.ndim != 2 or X.shape[1] != len(self.columns):
+            raise SchemaError(f"features must be a list of rows of {len(self.columns)} numbers")
+        return self.validate(X)
+
+    def parse_binary(self, body, declared_schema):
+        if declared_schema != self.name:
+            raise SchemaError(f"X-Feature-Schema must be '{self.name}' for this endpoint", status_code=415)
+        row_bytes = len(self.columns) * BINARY_DTYPE.itemsize
+        if not body or len(body) % row_bytes:
+            raise SchemaError(f"Body must be a whole number of {row_bytes}-byte rows, got {len(body)} bytes")
+        X = np.frombuffer(body, dtype=BINARY_DTYPE).reshape(-1, len(self.columns))
+        return self.validate(X)
+
+    def validate(self, X):
+        if len(X) == 0:
+            raise SchemaError("Batch is empty")
+        if len(X) > self.max_rows:
+            raise SchemaError(f"Batch has {len(X)} rows; the limit is {self.max_rows}", status_code=413)
+        invalid = ~(np.isfinite(X) & (X >= self.lower) & (X <= self.upper))
+        if invalid.any():
+            rows, cols = np.nonzero(invalid)
+            errors = [f"row {r}, {self.columns[c]}={float(X[r, c])}" for r, c in zip(rows[:MAX_REPORTED_ERRORS], cols[:MAX_REPORTED_ERRORS])]
+            raise SchemaError(f"{len(rows)} values non-finite or out of range: " + "; ".join(errors))
+        return X
+
+    def max_body_bytes(self, content_type):
+        row_bytes = len(self.columns) * BINARY_DTYPE.itemsize
+        if content_type == BINARY_CONTENT_TYPE:
+            return self.max_rows * row_bytes
+        return self.max_rows * len(self.columns) * MAX_JSON_BYTES_PER_VALUE + 1024
+
+    async def read_body(self, request, content_type):
+        # Oversized batches are refused before they are buffered, by header or while streaming
+        limit = self.max_body_bytes(content_type)
+        too_large = SchemaError(f"Body exceeds {limit} bytes, the limit for {self.max_rows} rows", status_code=413)
+        declared = request.headers.get("content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            raise too_large
+        chunks, size = [], 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise too_large
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def parse_request(self, request):
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if content_type not in (BINARY_CONTENT_TYPE, "application/json", ""):
+            raise SchemaError(f"Unsupported Content-Type '{content_type}'; use application/json or {BINARY_CONTENT_TYPE}",
+                              status_code=415)
+        body = await self.read_body(request, content_type)
+        if content_type == BINARY_CONTENT_TYPE:
+            return self.parse_binary(body, request.headers.get("x-feature-schema"))
+        return self.parse_columnar(body)
+
+def _json_bound(value):
+    return float(value) if np.isfinite(value) else None
+
+# Same order as the creditcard.csv columns the fraud LSTM and its scaler were trained on
+FRAUD_COLUMNS = ["Time"] + [f"V{i}" for i in range(1, 29)] + ["Amount"]
+FRAUD_SCHEMA = FeatureSchema("fraud-v1", FRAUD_COLUMNS, bounds={"Time": (0, np.inf), "Amount": (0, np.inf)})
+
+SCHEMAS = {schema.name: schema for schema in [FRAUD_SCHEMA]}
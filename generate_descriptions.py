@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import argparse
 import os
 
 # Paths
@@ -8,42 +10,85 @@ input_path = "data/creditcard.csv"
 output_path = "data/creditcard_with_descriptions.csv"
 chunk_size = 50000  # Process 50k rows at a time
 
-# Function to generate synthetic transaction descriptions
-def generate_description(row):
-    amount = row['Amount']
-    time = row['Time']
-    is_fraud = row['Class']
-    
-    # Categorize amount
-    amount_cat = "small" if amount < 50 else "medium" if amount < 500 else "large"
-    
-    # Convert time (seconds) to time of day
-    base_time = datetime(2023, 9, 1)
-    transaction_time = base_time + timedelta(seconds=time)
-    hour = transaction_time.hour
-    time_cat = "midnight" if 0 <= hour < 6 else "morning" if 6 <= hour < 12 else "afternoon" if 12 <= hour < 18 else "evening"
-    
-    # Define transaction types
-    transaction_types = ["online purchase", "in-store purchase", "ATM withdrawal", "international transfer"]
-    transaction_type = np.random.choice(transaction_types)
-    
-    # Generate description
-    descriptions = [
-        f"{'Suspicious' if is_fraud else 'Regular'} {amount_cat} {transaction_type} at {time_cat}",
-        f"{'Unauthorized' if is_fraud else 'Standard'} {amount_cat} {transaction_type} during {time_cat}",
-        f"{'Fraudulent' if is_fraud else 'Normal'} {amount_cat} {transaction_type} in {time_cat}"
-    ]
-    
-    return np.random.choice(descriptions)
+# Description vocabulary
+AMOUNT_BINS = [50, 500]  # small < 50 <= medium < 500 <= large
+AMOUNT_CATS = ["small", "medium", "large"]
+HOUR_BINS = [6, 12, 18]  # midnight < 6 <= morning < 12 <= afternoon < 18 <= evening
+TIME_CATS = ["midnight", "morning", "afternoon", "evening"]
+TRANSACTION_TYPES = ["online purchase", "in-store purchase", "ATM withdrawal", "international transfer"]
+TEMPLATES = [
+    ("Suspicious", "Regular", "{adjective} {amount} {type} at {time}"),
+    ("Unauthorized", "Standard", "{adjective} {amount} {type} during {time}"),
+    ("Fraudulent", "Normal", "{adjective} {amount} {type} in {time}"),
+]
 
-# Process dataset in chunks
-if not os.path.exists(output_path):
+# Every possible description, indexed by (template, fraud, amount, type, time)
+DESCRIPTION_TABLE = np.array([
+    template.format(adjective=fraud_word if is_fraud else normal_word, amount=amount, type=kind, time=time_cat)
+    for fraud_word, normal_word, template in TEMPLATES
+    for is_fraud in (0, 1)
+    for amount in AMOUNT_CATS
+    for kind in TRANSACTION_TYPES
+    for time_cat in TIME_CATS
+], dtype=object)
+
+# Generate synthetic transaction descriptions for a whole chunk at once
+def generate_descriptions(amount, time, is_fraud, rng):
+    amount_idx = np.digitize(amount, AMOUNT_BINS)
+    # Time is seconds since 2023-09-01 00:00, so the hour is just the seconds modulo a day
+    hour = (np.asarray(time, dtype=np.float64) // 3600).astype(np.int64) % 24
+    time_idx = np.digitize(hour, HOUR_BINS)
+    fraud_idx = (np.asarray(is_fraud) != 0).astype(np.int64)
+    type_idx = rng.integers(0, len(TRANSACTION_TYPES), size=len(amount_idx))
+    template_idx = rng.integers(0, len(TEMPLATES), size=len(amount_idx))
+    idx = (((template_idx * 2 + fraud_idx) * len(AMOUNT_CATS) + amount_idx) * len(TRANSACTION_TYPES) + type_idx) * len(TIME_CATS) + time_idx
+    return DESCRIPTION_TABLE[idx]
+
+def describe_chunk(chunk_index, amount, time, is_fraud, seed):
+    # Seeded per chunk, so output does not depend on worker count or scheduling
+    rng = np.random.default_rng([seed, chunk_index])
+    return generate_descriptions(amount, time, is_fraud, rng)
+
+def augment(input_path, output_path, chunk_size=chunk_size, workers=None, seed=42):
+    workers = workers or os.cpu_count() or 1
     first_chunk = True
-    for chunk in pd.read_csv(input_path, chunksize=chunk_size):
-        chunk['Description'] = chunk.apply(generate_description, axis=1)
+    tmp_path = f"{output_path}.tmp"
+
+    def write(chunk, descriptions):
+        nonlocal first_chunk
+        chunk['Description'] = descriptions
         mode = 'w' if first_chunk else 'a'
-        chunk.to_csv(output_path, mode=mode, index=False, header=first_chunk)
+        chunk.to_csv(tmp_path, mode=mode, index=False, header=first_chunk)
         first_chunk = False
-    print(f"Augmented dataset saved to {output_path}")
-else:
-    print(f"Augmented dataset already exists at {output_path}")
\ No newline at end of file
+
+    chunks = pd.read_csv(input_path, chunksize=chunk_size)
+    if workers == 1:
+        for i, chunk in enumerate(chunks):
+            write(chunk, describe_chunk(i, chunk['Amount'].to_numpy(), chunk['Time'].to_numpy(), chunk['Class'].to_numpy(), seed))
+    else:
+        # Keep a bounded window of chunks in flight and write them back in order
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, chunk in enumerate(chunks):
+                pending.append((chunk, pool.submit(describe_chunk, i, chunk['Amount'].to_numpy(), chunk['Time'].to_numpy(), chunk['Class'].to_numpy(), seed)))
+                if len(pending) >= 2 * workers:
+                    done, future = pending.popleft()
+                    write(done, future.result())
+            while pending:
+                done, future = pending.popleft()
+                write(done, future.result())
+    os.replace(tmp_path, output_path)
+
+# Process dataset in chunks
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add synthetic transaction descriptions to creditcard.csv")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Regenerate even if the output exists")
+    args = parser.parse_args()
+
+    if not os.path.exists(output_path) or args.force:
+        augment(input_path, output_path, chunk_size, args.workers, args.seed)
+        print(f"Augmented dataset saved to {output_path}")
+    else:
+        print(f"Augmented dataset already exists at {output_path}")
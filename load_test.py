@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import functools
+import json
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import psutil
+
+# Reproducible load benchmark for the API. The app is imported in-process and
+# served through httpx's ASGI transport. Its artifacts and datasets come from a
+# local fake artifact server (the "mirror" store), and Gemini is replaced by a
+# stub, so runs need no network and no credentials. Requests are spread over
+# endpoints according to a weighted mix. The result is machine-readable JSON
+# with throughput, p50/p95/p99 latency and process RSS per endpoint.
+# --baseline compares against a stored run and exits non-zero on regressions.
+
+LOAN_SAMPLE = {
+    "Age": 35, "Income": 55000, "LoanAmount": 15000, "CreditScore": 680, "MonthsEmployed": 48,
+    "NumCreditLines": 3, "InterestRate": 7.5, "LoanTerm": 36, "DTIRatio": 0.35,
+    "Education": "bachelor", "EmploymentType": "full-time", "MaritalStatus": "married",
+    "HasMortgage": "yes", "HasDependents": "no", "LoanPurpose": "home", "HasCoSigner": "no",
+}
+CREDIT_RISK_SAMPLE = {
+    "person_age": 28, "person_income": 42000, "person_home_ownership": "rent", "person_emp_length": 4.0,
+    "loan_intent": "education", "loan_grade": "b", "loan_amnt": 8000, "loan_int_rate": 11.2,
+    "loan_percent_income": 0.19, "cb_person_default_on_file": "n", "cb_person_cred_hist_length": 5,
+}
+FRAUD_SAMPLE = {"Time": 406.0, **{f"V{i}": 0.1 * ((-1) ** i) * i for i in range(1, 29)}, "Amount": 12.5}
+
+MIXES = {
+    "default": {"predict": 3, "credit_risk": 3, "fraud": 3, "chat": 1, "stats": 1,
+                "history_save": 1, "history_get": 1, "history_delete": 1},
+    "predictions": {"predict": 1, "credit_risk": 1, "fraud": 1},
+    "chat": {"chat": 3, "history_save": 1, "history_get": 2, "history_delete": 1},
+    "stats": {"stats": 1},
+}
+
+def build_fixtures(out_dir, rows=2000, seed=0):
+    # Small but real artifacts: every model/scaler/encoder the endpoints load,
+    # plus the CSVs /stats/ reads, written under their Drive file names
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler, LabelEncoder
+    import torch
+    from train_model import features as loan_features
+    from train_credit_risk_model import features as credit_features, categorical_cols
+    from train_lstm_fraud import LSTMFraudClassifier
+    from preprocessing import CATEGORICAL_MAPPINGS
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    def dump(name, obj):
+        with open(os.path.join(out_dir, name), "wb") as f:
+            pickle.dump(obj, f)
+
+    loan = pd.DataFrame({col: rng.normal(50, 15, rows) for col in loan_features})
+    for col, mapping in CATEGORICAL_MAPPINGS.items():
+        loan[col] = rng.integers(0, len(mapping), rows)
+    loan["Default"] = (rng.random(rows) < 0.12).astype(int)
+    loan.to_csv(os.path.join(out_dir, "loan_data.csv"), index=False)
+    scaler = StandardScaler().fit(loan[loan_features].astype("float64"))
+    dump("scaler.pkl", scaler)
+    dump("loan_model.pkl", RandomForestClassifier(n_estimators=50, random_state=seed).fit(
+        pd.DataFrame(scaler.transform(loan[loan_features].astype("float64")), columns=loan_features), loan["Default"]))
+
+    categories = {
+        "person_home_ownership": ["rent", "own", "mortgage", "other"],
+        "loan_intent": ["personal", "education", "medical", "venture", "homeimprovement", "debtconsolidation"],
+        "loan_grade": list("abcdefg"),
+        "cb_person_default_on_file": ["y", "n"],
+    }
+    credit = pd.DataFrame({col: rng.normal(10, 3, rows) for col in credit_features})
+    credit["loan_percent_income"] = rng.random(rows)
+    for col in categorical_cols:
+        le = LabelEncoder().fit(categories[col])
+        credit[col] = le.transform(rng.choice(categories[col], rows))
+        dump(f"le_{col}.pkl", le)
+    credit["loan_status"] = (rng.random(rows) < 0.2).astype(int)
+    credit.to_csv(os.path.join(out_dir, "credit_risk_data_encoded.csv"), index=False)
+    credit_scaler = StandardScaler().fit(credit[credit_features].to_numpy())
+    dump("credit_risk_scaler.pkl", credit_scaler)
+    dump("credit_risk_model.pkl", RandomForestClassifier(n_estimators=50, random_state=seed).fit(
+        credit_scaler.transform(credit[credit_features].to_numpy()), credit["loan_status"]))
+
+    dump("fraud_scaler.pkl", StandardScaler().fit(rng.normal(size=(rows, 30))))
+    torch.manual_seed(seed)
+    torch.save(LSTMFraudClassifier(30, 64, 2).state_dict(), os.path.join(out_dir, "lstm_fraud_model.pth"))
+    return out_dir
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeArtifactServer:
+    # Serves a directory by file name, like the HTTP mirror the artifact store
+    # expects, with an optional fixed delay per request to mimic a remote store
+    def __init__(self, directory, latency_ms=0.0):
+        handler = type("Handler", (_QuietHandler,), {"latency": latency_ms / 1000})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=directory))
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class StubChatModel:
+    # Stands in for genai.GenerativeModel; blocks like the real client does
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+
+    def generate_content(self, contents, generation_config=None):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = contents[0]["parts"][0]["text"]
+        return SimpleNamespace(text=f"## Answer\n**Stub** reply to {len(prompt)} prompt characters.")
+
+def configure_env(work_dir, artifact_url):
+    # Must run before any app module is imported: they read these at import time
+    os.environ.update({
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "load-test"),
+        "ARTIFACT_STORES": "mirror",
+        "ARTIFACT_MIRROR_URL": artifact_url,
+        "DATASET_CACHE_DIR": os.path.join(work_dir, "cache"),
+        "DB_PATH": os.path.join(work_dir, "chat_history.db"),
+        "RATE_LIMIT_STORAGE": f"sqlite:///{os.path.join(work_dir, 'rate_limits.db')}",
+        "PREFETCH_ON_STARTUP": "0",
+    })
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    conn.execute("CREATE TABLE IF NOT EXISTS chat_history (session_id TEXT, user_id TEXT, mode TEXT, message TEXT, "
+                 "response TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.commit()
+    conn.close()
+
+def boot_app(chat_latency_ms=0.0, rate_limits=False):
+    import main
+    main.chat_model = StubChatModel(chat_latency_ms)
+    # /chat/ allows 10/minute per client; a load test from one address would only measure 429s
+    main.limiter.enabled = rate_limits
+    return main.app
+
+def _request(endpoint, rng):
+    session = f"bench-{rng.randrange(8)}"
+    chat = {"session_id": session, "user_id": "bench", "mode": "general", "message": "How do credit scores work?"}
+    return {
+        "predict": ("POST", "/predict/", {"json": LOAN_SAMPLE}),
+        "credit_risk": ("POST", "/credit_risk/", {"json": CREDIT_RISK_SAMPLE}),
+        "fraud": ("POST", "/fraud/", {"json": FRAUD_SAMPLE}),
+        "chat": ("POST", "/chat/", {"json": chat}),
+        "stats": ("GET", "/stats/", {}),
+        "history_save": ("POST", "/chat_history/", {"json": chat, "params": {"response": "stub"}}),
+        "history_get": ("GET", f"/chat_history/{session}/general", {}),
+        "history_delete": ("DELETE", f"/chat_history/{session}/general", {}),
+    }[endpoint]
+
+def _ok(endpoint, status):
+    # An empty history is a 404 by design; it shows up once deletes run in the mix
+    return status < 400 or (endpoint == "history_get" and status == 404)
+
+def _summarize(samples, duration):
+    latencies = np.array([s["ms"] for s in samples])
+    rss = np.array([s["rss_mb"] for s in samples])
+    return {
+        "requests": len(samples),
+        "errors": sum(not s["ok"] for s in samples),
+        "throughput_rps": len(samples) / duration if duration else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "rss_mb_mean": float(rss.mean()),
+        "rss_mb_max": float(rss.max()),
+    }
+
+async def run_load(client, mix, total_requests, concurrency, seed=0, pid=None):
+    process = psutil.Process(pid)
+    rng = random.Random(seed)
+    endpoints, weights = zip(*mix.items())
+    plan = rng.choices(endpoints, weights=weights, k=total_requests)
+    samples = {endpoint: [] for endpoint in endpoints}
+    queue = asyncio.Queue()
+    for endpoint in plan:
+        queue.put_nowait(endpoint)
+
+    async def worker(worker_id):
+        worker_rng = random.Random(seed * 1000 + worker_id)
+        while not queue.empty():
+            endpoint = queue.get_nowait()
+            method, path, kwargs = _request(endpoint, worker_rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = _ok(endpoint, response.status_code)
+            except Exception:
+                ok = False
+            ms = (time.perf_counter() - start) * 1000
+            samples[endpoint].append({"ms": ms, "ok": ok, "rss_mb": process.memory_info().rss / 2**20})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    duration = time.perf_counter() - start
+    report = {endpoint: _summarize(s, duration) for endpoint, s in samples.items() if s}
+    report["_total"] = _summarize([x for s in samples.values() for x in s], duration)
+    report["_total"]["seconds"] = duration
+    return report
+
+async def warm_up(client, mix):
+    # One request per endpoint so cold artifact downloads are reported separately
+    cold = {}
+    for endpoint in mix:
+        method, path, kwargs = _request(endpoint, random.Random(0))
+        start = time.perf_counter()
+        response = await client.request(method, path, **kwargs)
+        cold[endpoint] = {"ms": (time.perf_counter() - start) * 1000, "status": response.status_code}
+    return cold
+
+def compare(current, baseline, tolerance=0.2):
+    # A regression is p95/p99 above, or throughput below, baseline by more than
+    # the tolerance, or any new errors on an endpoint
+    regressions = []
+    for endpoint, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if now[key] > before[key] * (1 + tolerance):
+                regressions.append({"endpoint": endpoint, "metric": key, "baseline": before[key], "current": now[key]})
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append({"endpoint": endpoint, "metric": "throughput_rps",
+                                "baseline": before["throughput_rps"], "current": now["throughput_rps"]})
+        if now["errors"] > before["errors"]:
+            regressions.append({"endpoint": endpoint, "metric": "errors", "baseline": before["errors"], "current": now["errors"]})
+    return regressions
+
+def parse_mix(spec):
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for part in spec.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint not in MIXES["default"]:
+            raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+        mix[endpoint] = float(weight or 1)
+    return mix
+
+async def main_async(args):
+    import httpx
+    mix = parse_mix(args.mix)
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures = os.path.join(work_dir, "artifacts")
+        os.makedirs(fixtures)
+        with FakeArtifactServer(fixtures, args.artifact_latency_ms) as server:
+            configure_env(work_dir, server.url)
+            build_fixtures(fixtures, args.rows, args.seed)
+            app = boot_app(args.chat_latency_ms, args.rate_limits)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=120) as client:
+                cold = await warm_up(client, mix)
+                endpoints = await run_load(client, mix, args.requests, args.concurrency, args.seed)
+    total = endpoints.pop("_total")
+    return {
+        "config": {"mix": mix, "requests": args.requests, "concurrency": args.concurrency, "rows": args.rows,
+                   "artifact_latency_ms": args.artifact_latency_ms, "chat_latency_ms": args.chat_latency_ms,
+                   "seed": args.seed, "python": sys.version.split()[0], "cpus": os.cpu_count()},
+        "cold": cold,
+        "endpoints": endpoints,
+        "total": total,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API against a fake artifact server and stub Gemini")
+    parser.add_argument("--mix", default="default", help=f"Preset ({', '.join(MIXES)}) or endpoint=weight,... e.g. predict=3,chat=1")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=2000, help="Rows in the generated datasets")
+    parser.add_argument("--artifact-latency-ms", type=float, default=0.0, help="Delay added to every artifact download")
+    parser.add_argument("--chat-latency-ms", type=float, default=50.0, help="Delay of the stub Gemini model")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep slowapi limits enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="Compare against this report and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging (default: 0.2)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline instead of comparing")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    status = 0
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        if baseline.get("config") != report["config"]:
+            # Per-endpoint throughput depends on the mix, request count and concurrency
+            print("Warning: baseline was recorded with a different config", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    for r in report.get("regressions", []):
+        print(f"REGRESSION {r['endpoint']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f}", file=sys.stderr)
+    sys.exit(status)
@@ -0,0 +1,149 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from pythonjsonlogger.json import JsonFormatter
+
+import metrics
+
+# Logging for the API. Records are put on a bounded queue by the thread that
+# logs them and are formatted and written by a QueueListener thread, so the
+# event loop never blocks on stderr. When the queue is full, records are
+# dropped and counted rather than stalling the request.
+#
+# LOG_LEVELS sets levels per logger ("main=DEBUG,sqlalchemy.engine=INFO").
+# DEBUG records are sampled per request with LOG_DEBUG_SAMPLE_RATE, so a
+# sampled request keeps all its debug lines. Every record carries the request
+# ID of the request that produced it. The ID is taken from an incoming
+# X-Request-ID header or generated, and is returned in the response.
+#
+# The LOG_* settings are read when setup_logging() and instrument() run, not
+# at import, so values loaded from .env after the import still apply.
+
+# Chatty libraries stay quiet unless LOG_LEVELS asks for them
+DEFAULT_LEVELS = {
+    "sqlalchemy.engine": "WARNING",
+    "aiosqlite": "WARNING",
+    "urllib3": "WARNING",
+    "httpx": "WARNING",
+    "httpcore": "WARNING",
+    "matplotlib": "WARNING",
+}
+
+_request_id = ContextVar("request_id", default=None)
+_debug_sampled = ContextVar("debug_sampled", default=None)
+
+_listener = None
+
+def parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, level = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid LOG_LEVELS entry '{item}', expected logger=LEVEL")
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level '{level}' for logger '{name.strip()}'")
+        levels[name.strip()] = level
+    return levels
+
+class ContextFilter(logging.Filter):
+    # Runs in the thread that logs the record, where the request's context variables are visible
+    def __init__(self, debug_sample_rate=None):
+        super().__init__()
+        self.debug_sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0")) if debug_sample_rate is None else debug_sample_rate
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and self.debug_sample_rate < 1:
+            sampled = _debug_sampled.get()
+            if sampled is None:
+                sampled = random.random() < self.debug_sample_rate
+            if not sampled:
+                return False
+        record.request_id = _request_id.get()
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Only resolve the message and traceback here; the listener does the formatting
+        # Modified in place rather than copied: this is the only root handler, and
+        # root handlers are the last to see a record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+def _formatter(fmt):
+    if fmt == "json":
+        return JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s %(request_id)s",
+                             rename_fields={"levelname": "level", "name": "logger"})
+    return logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+def setup_logging(level=None, levels=None, fmt=None, stream=None):
+    # Idempotent: the first call installs the queue, later calls only re-apply levels
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    levels = os.getenv("LOG_LEVELS", "") if levels is None else levels
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    root = logging.getLogger()
+    if _listener is None:
+        if fmt not in ("json", "text"):
+            raise ValueError(f"LOG_FORMAT must be 'json' or 'text', got '{fmt}'")
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(_formatter(fmt))
+        queue_handler = DroppingQueueHandler(queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+        queue_handler.addFilter(ContextFilter())
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        root.addHandler(queue_handler)
+        _listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    root.setLevel(level)
+    for name, name_level in {**DEFAULT_LEVELS, **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(name_level)
+    # uvicorn installs its own synchronous handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+def stop_logging():
+    # Flushes whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def instrument(app, debug_sample_rate=None):
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+    @app.middleware("http")
+    async def attach_request_id(request, call_next):
+        request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+        id_token = _request_id.set(request_id)
+        sample_token = _debug_sampled.set(random.random() < debug_sample_rate)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_id.reset(id_token)
+            _debug_sampled.reset(sample_token)
+        response.headers["X-Request-ID"] = request_id
+        return response
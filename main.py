@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, field_validator
 import pandas as pd
@@ -6,7 +6,6 @@ import pickle
 import torch
 import torch.nn as nn
 import numpy as np
-from preprocessing import preprocess_input
 import google.generativeai as genai
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -16,22 +15,52 @@ import os
 import logging
 import sqlite3
 import time
+from typing import Optional
 import uvicorn
-from model_loader import load_from_drive
+
+# Loaded before the local modules below: several (tracing, artifact_store,
+# metrics, model_registry, drift) read their settings when imported
+load_dotenv()
+
+from preprocessing import preprocess_input, load_credit_risk_encoders, LOAN_FEATURES, CREDIT_RISK_FEATURES
 import data_loader
 import model_loader
-
-logging.basicConfig(level=logging.DEBUG)
+import prefetch
+from artifact_store import get_store
+from singleflight import SingleFlight
+import singleflight
+import asyncio
+from text_scoring import get_scorer
+from explanations import explanations, MODES as EXPLAIN_MODES
+from model_registry import registry
+import drift
+from drift import monitor as drift_monitor
+from feature_schema import FRAUD_COLUMNS, FRAUD_SCHEMA, SCHEMAS, SchemaError
+import metrics
+import tracing
+import log_config
+import rate_limit_storage  # registers the sqlite:// rate limit storage
+from tracing import span
+
+log_config.setup_logging()
 logger = logging.getLogger(__name__)
 
-load_dotenv()
 app = FastAPI()
 DB_PATH = os.getenv("DB_PATH", "chat_history.db")
 DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in RATE_LIMIT_STORAGE so the limits hold across workers; if the
+# store becomes unreachable, slowapi falls back to per-process memory
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "sqlite:///data/rate_limits.db")
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+limiter = Limiter(key_func=get_remote_address, storage_uri=RATE_LIMIT_STORAGE,
+                  strategy=RATE_LIMIT_STRATEGY, in_memory_fallback_enabled=True)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+metrics.instrument(app)
+tracing.instrument(app)
+log_config.instrument(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["https://finlytic.vercel.app", "http://localhost:5173", "http://127.0.0.1:5173"], 
@@ -69,47 +98,88 @@ CREDIT_RISK_SCALER_PATH = os.path.join(MODEL_DIR, "credit_risk_scaler.pkl")
 FRAUD_MODEL_PATH = os.path.join(MODEL_DIR, "lstm_fraud_model.pth")
 FRAUD_SCALER_PATH = os.path.join(MODEL_DIR, "fraud_scaler.pkl")
 
-loan_model = None
-loan_scaler = None
-credit_risk_model = None
-credit_risk_scaler = None
-fraud_model = None
-fraud_scaler = None
-
-def load_loan_model():
-    global loan_model, loan_scaler
-    if loan_model is None or loan_scaler is None:
-        try:
-            loan_model = load_from_drive("loan_model.pkl")
-            loan_scaler = load_from_drive("scaler.pkl")
-            logger.info("Loan model and scaler loaded")
-        except Exception as e:
-            logger.error(f"Error loading loan model or scaler: {e}")
-            raise HTTPException(status_code=500, detail="Failed to load loan model")
-
-def load_credit_risk_model():
-    global credit_risk_model, credit_risk_scaler
-    if credit_risk_model is None or credit_risk_scaler is None:
-        try:
-            credit_risk_model = load_from_drive("credit_risk_model.pkl")
-            credit_risk_scaler = load_from_drive("credit_risk_scaler.pkl")
-            logger.info("Credit risk model and scaler loaded")
-        except Exception as e:
-            logger.error(f"Error loading credit risk model or scaler: {e}")
-            raise HTTPException(status_code=500, detail="Failed to load credit risk model")
-
-def load_fraud_model():
-    global fraud_model, fraud_scaler
-    if fraud_model is None or fraud_scaler is None:
-        try:
-            fraud_model = load_from_drive("lstm_fraud_model.pth", is_torch=True)
-            fraud_scaler = load_from_drive("fraud_scaler.pkl")
-            logger.info("Fraud model and scaler loaded")
-        except Exception as e:
-            logger.error(f"Error loading fraud model or scaler: {e}")
-            raise HTTPException(status_code=500, detail="Failed to load fraud model")
-        
-
+stats_computations = SingleFlight("stats")
+
+class LSTMFraudClassifier(nn.Module):
+    def __init__(self, input_dim, hidden_dim, num_layers):
+        super(LSTMFraudClassifier, self).__init__()
+        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
+        self.fc = nn.Linear(hidden_dim, 1)
+        self.sigmoid = nn.Sigmoid()
+
+    def forward(self, x):
+        _, (hn, _) = self.lstm(x)
+        out = self.fc(hn[-1])
+        out = self.sigmoid(out)
+        return out
+
+def build_fraud_model(state_dict):
+    # Built once per model version rather than per request
+    # Trained on every creditcard.csv column except Class (30), read from the weights
+    input_dim = state_dict["lstm.weight_ih_l0"].shape[1]
+    model = LSTMFraudClassifier(input_dim, 64, 2)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+# Scoring as the endpoints do it, used for canary checks and shadow traffic
+def loan_probabilities(version, records):
+    X = preprocess_input(pd.DataFrame(records), version.scaler, model_type='loan_default')
+    return version.model.predict_proba(X)[:, 1]
+
+def credit_risk_probabilities(version, records):
+    X = np.array([preprocess_input(r, version.scaler, model_type='credit_risk') for r in records])
+    return version.model.predict_proba(X)[:, 1]
+
+def fraud_probabilities(version, X):
+    input_tensor = torch.FloatTensor(version.scaler.transform(X)).unsqueeze(1)
+    with torch.no_grad():
+        return version.model(input_tensor).squeeze(1).numpy()
+
+# Inputs every new model version must score with valid probabilities before it serves
+LOAN_CANARY = [
+    {"Age": 35, "Income": 55000, "LoanAmount": 15000, "CreditScore": 680, "MonthsEmployed": 48,
+     "NumCreditLines": 3, "InterestRate": 7.5, "LoanTerm": 36, "DTIRatio": 0.35,
+     "Education": "bachelor", "EmploymentType": "full-time", "MaritalStatus": "married",
+     "HasMortgage": "yes", "HasDependents": "no", "LoanPurpose": "home", "HasCoSigner": "no"},
+    {"Age": 22, "Income": 18000, "LoanAmount": 40000, "CreditScore": 420, "MonthsEmployed": 3,
+     "NumCreditLines": 1, "InterestRate": 22.0, "LoanTerm": 60, "DTIRatio": 0.85,
+     "Education": "high school", "EmploymentType": "unemployed", "MaritalStatus": "single",
+     "HasMortgage": "no", "HasDependents": "yes", "LoanPurpose": "other", "HasCoSigner": "no"},
+]
+CREDIT_RISK_CANARY = [
+    {"person_age": 28, "person_income": 42000, "person_home_ownership": "rent", "person_emp_length": 4.0,
+     "loan_intent": "education", "loan_grade": "b", "loan_amnt": 8000, "loan_int_rate": 11.2,
+     "loan_percent_income": 0.19, "cb_person_default_on_file": "n", "cb_person_cred_hist_length": 5},
+    {"person_age": 45, "person_income": 150000, "person_home_ownership": "mortgage", "person_emp_length": 20.0,
+     "loan_intent": "homeimprovement", "loan_grade": "a", "loan_amnt": 10000, "loan_int_rate": 6.0,
+     "loan_percent_income": 0.07, "cb_person_default_on_file": "n", "cb_person_cred_hist_length": 15},
+]
+FRAUD_CANARY = np.array([[406.0] + [0.0] * 28 + [12.5], [80000.0] + [1.0, -1.0] * 14 + [250.0]])
+
+registry.register("loan", {"model": "loan_model.pkl", "scaler": "scaler.pkl"}, loan_probabilities, LOAN_CANARY)
+registry.register("credit_risk", {"model": "credit_risk_model.pkl", "scaler": "credit_risk_scaler.pkl"},
+                  credit_risk_probabilities, CREDIT_RISK_CANARY)
+registry.register("fraud", {"model": "lstm_fraud_model.pth", "scaler": "fraud_scaler.pkl"}, fraud_probabilities,
+                  FRAUD_CANARY, is_torch=True, prepare=build_fraud_model)
+
+async def load_model_version(name):
+    # Concurrent cold-start requests share one download/unpickle per model
+    try:
+        return await registry.get(name)
+    except Exception as e:
+        logger.error(f"Error loading {name} model or scaler: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to load {name} model")
+
+@app.on_event("startup")
+async def warm_artifacts():
+    # Download every artifact/dataset concurrently instead of one by one on first use
+    if os.getenv("PREFETCH_ON_STARTUP", "0") == "1":
+        prefetch.prefetch_in_background()
+    # Pick up model versions promoted through another worker
+    registry.start_watcher()
+    # Feature histograms of live traffic, compared with the training data by /drift/
+    asyncio.get_running_loop().create_task(drift_monitor.start())
 
 class LoanInput(BaseModel):
     Age: int
@@ -246,6 +316,89 @@ class FraudInput(BaseModel):
     V28: float
     Amount: float
 
+class TextFraudInput(BaseModel):
+    descriptions: list[str]
+
+    @field_validator('descriptions')
+    @classmethod
+    def validate_descriptions(cls, v: list[str]) -> list[str]:
+        if not v or len(v) > 256:
+            raise ValueError('descriptions must contain between 1 and 256 items')
+        return v
+
+class ExplainOptions(BaseModel):
+    mode: str = "auto"
+    budget_ms: Optional[float] = None
+    top_k: Optional[int] = None
+
+    @field_validator('mode')
+    @classmethod
+    def validate_mode(cls, v: str) -> str:
+        if v not in EXPLAIN_MODES:
+            raise ValueError(f'mode must be one of {EXPLAIN_MODES}')
+        return v
+
+    @field_validator('top_k')
+    @classmethod
+    def validate_top_k(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError('top_k must be at least 1')
+        return v
+
+class LoanExplainInput(ExplainOptions):
+    inputs: list[LoanInput]
+
+    @field_validator('inputs')
+    @classmethod
+    def validate_inputs(cls, v: list[LoanInput]) -> list[LoanInput]:
+        if not v or len(v) > 256:
+            raise ValueError('inputs must contain between 1 and 256 items')
+        return v
+
+class CreditRiskExplainInput(ExplainOptions):
+    inputs: list[CreditRiskInput]
+
+    @field_validator('inputs')
+    @classmethod
+    def validate_inputs(cls, v: list[CreditRiskInput]) -> list[CreditRiskInput]:
+        if not v or len(v) > 256:
+            raise ValueError('inputs must contain between 1 and 256 items')
+        return v
+
+class ModelCandidate(BaseModel):
+    version: str
+    model_file: str
+    scaler_file: str
+    file_ids: dict[str, str] = {}
+    shadow_fraction: float = 0.0
+
+    @field_validator('shadow_fraction')
+    @classmethod
+    def validate_shadow_fraction(cls, v: float) -> float:
+        if not 0 <= v <= 1:
+            raise ValueError('shadow_fraction must be between 0 and 1')
+        return v
+
+class ShadowConfig(BaseModel):
+    shadow_fraction: float
+
+    @field_validator('shadow_fraction')
+    @classmethod
+    def validate_shadow_fraction(cls, v: float) -> float:
+        if not 0 <= v <= 1:
+            raise ValueError('shadow_fraction must be between 0 and 1')
+        return v
+
+class ProfilerConfig(BaseModel):
+    sample_rate: float
+
+    @field_validator('sample_rate')
+    @classmethod
+    def validate_sample_rate(cls, v: float) -> float:
+        if not 0 <= v <= 1:
+            raise ValueError('sample_rate must be between 0 and 1')
+        return v
+
 class ChatInput(BaseModel):
     session_id: str
     user_id: str | None
@@ -254,40 +407,43 @@ class ChatInput(BaseModel):
 
 @app.post("/predict/")
 async def predict_loan_default(input_data: LoanInput):
-    global loan_model, loan_scaler
-    load_loan_model()  # Lazy load only when needed
-    if loan_scaler is None or loan_model is None:
-        raise HTTPException(status_code=500, detail="Model or scaler not loaded properly")
+    # The serving version is taken once; a promotion mid-request doesn't affect it
+    with span("load_model"):
+        version = await load_model_version("loan")
     try:
+        record = input_data.dict()
         # Preprocess input data
-        processed_input = preprocess_input(input_data.dict(), loan_scaler, model_type='loan_default')
+        with span("preprocess"):
+            processed_input = preprocess_input(record, version.scaler, model_type='loan_default')
         # Predict using RandomForest model
-        prediction = loan_model.predict(processed_input)[0]
-        probability = loan_model.predict_proba(processed_input)[0][1]
+        with span("predict"):
+            prediction = version.model.predict(processed_input)[0]
+        with span("predict_proba"):
+            probability = version.model.predict_proba(processed_input)[0][1]
+        registry.shadow("loan", [record], [probability])
+        drift_monitor.observe("loan", [record])
         return {"prediction": int(prediction), "probability": float(probability)}
     except Exception as e:
         logger.error(f"Prediction error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
-    finally:
-        # Optional: Clear memory after use
-        del loan_model, loan_scaler
-        loan_model = None
-        loan_scaler = None
-        import gc
-        gc.collect()
 
 @app.post("/credit_risk/")
 async def predict_credit_risk(input_data: CreditRiskInput):
-    global credit_risk_model, credit_risk_scaler
-    load_credit_risk_model()  # Lazy load only when needed
-    if credit_risk_scaler is None or credit_risk_model is None:
-        raise HTTPException(status_code=500, detail="Model or scaler not loaded properly")
+    with span("load_model"):
+        version = await load_model_version("credit_risk")
     try:
-        # Preprocess input data
-        processed_input = preprocess_input(input_data.dict(), credit_risk_scaler, model_type='credit_risk')
+        with span("load_encoders"):
+            await asyncio.to_thread(load_credit_risk_encoders)
+        record = input_data.dict()
+        # Preprocess input data; records its own encode/scale spans
+        processed_input = preprocess_input(record, version.scaler, model_type='credit_risk')
         # Predict using RandomForest model
-        prediction = credit_risk_model.predict([processed_input])[0]
-        probability = credit_risk_model.predict_proba([processed_input])[0][1]
+        with span("predict"):
+            prediction = version.model.predict([processed_input])[0]
+        with span("predict_proba"):
+            probability = version.model.predict_proba([processed_input])[0][1]
+        registry.shadow("credit_risk", [record], [probability])
+        drift_monitor.observe("credit_risk", [record])
         risk_category = "Low" if probability < 0.3 else "Medium" if probability < 0.7 else "High"
         return {
             "credit_risk_prediction": risk_category,
@@ -296,60 +452,119 @@ async def predict_credit_risk(input_data: CreditRiskInput):
     except Exception as e:
         logger.error(f"Credit risk prediction error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Credit risk prediction failed: {str(e)}")
-    finally:
-        # Optional: Clear memory after use
-        del credit_risk_model, credit_risk_scaler
-        credit_risk_model = None
-        credit_risk_scaler = None
-        import gc
-        gc.collect()
 
-@app.post("/fraud/")
-async def detect_fraud(input_data: FraudInput):
-    global fraud_model, fraud_scaler
-    load_fraud_model()  # Lazy load only when needed
-    if fraud_scaler is None or fraud_model is None:
-        raise HTTPException(status_code=500, detail="Model or scaler not loaded properly")
+@app.post("/explain/loan/")
+async def explain_loan_default(input_data: LoanExplainInput):
+    # SHAP attributions per input feature (scaled space), largest first; the
+    # explainer is reused for as long as the serving version is unchanged
+    with span("load_model"):
+        version = await load_model_version("loan")
     try:
+        with span("preprocess"):
+            X = preprocess_input(pd.DataFrame([i.dict() for i in input_data.inputs]), version.scaler, model_type='loan_default')
+        with span("explain"):
+            return await explanations.explain("loan", version.model, X.to_numpy(dtype=np.float64), LOAN_FEATURES,
+                                              input_data.mode, input_data.budget_ms, input_data.top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Loan explanation error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Explanation failed: {str(e)}")
+
+@app.post("/explain/credit_risk/")
+async def explain_credit_risk(input_data: CreditRiskExplainInput):
+    with span("load_model"):
+        version = await load_model_version("credit_risk")
+    try:
+        with span("load_encoders"):
+            await asyncio.to_thread(load_credit_risk_encoders)
+        X = np.array([preprocess_input(i.dict(), version.scaler, model_type='credit_risk') for i in input_data.inputs])
+        with span("explain"):
+            return await explanations.explain("credit_risk", version.model, X, CREDIT_RISK_FEATURES,
+                                              input_data.mode, input_data.budget_ms, input_data.top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Credit risk explanation error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Explanation failed: {str(e)}")
+
+@app.get("/explain_stats/")
+async def explain_stats(request: Request):
+    # This worker's explainer cost estimates (ms per row, by method) and cached
+    # rows; the all-worker view is explanation_seconds_total in /metrics
+    _require_admin(request)
+    return explanations.stats()
+
+@app.get("/drift/")
+async def feature_drift(windows: int = 1):
+    # PSI of each input feature over the last `windows` windows, all workers merged
+    if windows < 1 or windows > drift.DRIFT_RETENTION_WINDOWS:
+        raise HTTPException(status_code=422, detail=f"windows must be between 1 and {drift.DRIFT_RETENTION_WINDOWS}")
+    report = await asyncio.to_thread(drift_monitor.report, windows)
+    if report is None:
+        raise HTTPException(status_code=503, detail="No drift reference loaded; build it with `python drift.py`")
+    return report
+
+async def score_fraud(X):
+    # X: (rows, 30) in FRAUD_COLUMNS order; returns one probability per row
+    with span("load_model"):
+        version = await load_model_version("fraud")
+    def forward():
         # Prepare input for LSTM
-        scaled_input = fraud_scaler.transform([list(input_data.dict().values())])
-        input_tensor = torch.FloatTensor(scaled_input).unsqueeze(1)  # [1, 1, 29]
-        
-        # Use the loaded state dict directly
-        class LSTMFraudClassifier(nn.Module):
-            def __init__(self, input_dim, hidden_dim, num_layers):
-                super(LSTMFraudClassifier, self).__init__()
-                self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
-                self.fc = nn.Linear(hidden_dim, 1)
-                self.sigmoid = nn.Sigmoid()
-
-            def forward(self, x):
-                _, (hn, _) = self.lstm(x)
-                out = self.fc(hn[-1])
-                out = self.sigmoid(out)
-                return out
-
-        # Initialize and load model
-        input_dim = 29
-        hidden_dim = 64
-        num_layers = 2
-        model_instance = LSTMFraudClassifier(input_dim, hidden_dim, num_layers)
-        model_instance.load_state_dict(fraud_model)
-        model_instance.eval()
-
-        with torch.no_grad():
-            output = model_instance(input_tensor).squeeze().item()
-        return {"fraud_probability": output}
+        with span("scale"):
+            scaled_input = version.scaler.transform(X)
+            input_tensor = torch.FloatTensor(scaled_input).unsqueeze(1)  # [rows, 1, 30]
+        with span("forward"), torch.no_grad():
+            return version.model(input_tensor).squeeze(1).numpy()
+
+    try:
+        # Off the event loop: a 10000-row batch would otherwise stall every other request
+        probabilities = await asyncio.to_thread(forward)
+        registry.shadow("fraud", X, probabilities)
+        drift_monitor.observe_array("fraud", X)
+        return probabilities
     except Exception as e:
         logger.error(f"Fraud detection error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Fraud detection failed: {str(e)}")
-    finally:
-        # Optional: Clear memory after use
-        del fraud_model, fraud_scaler
-        fraud_model = None
-        fraud_scaler = None
-        import gc
-        gc.collect()
+
+@app.post("/fraud/")
+async def detect_fraud(input_data: FraudInput):
+    # Explicit column order rather than relying on the order of model fields
+    X = np.array([[getattr(input_data, column) for column in FRAUD_COLUMNS]])
+    probabilities = await score_fraud(X)
+    return {"fraud_probability": float(probabilities[0])}
+
+@app.post("/fraud/batch/")
+async def detect_fraud_batch(request: Request):
+    # Columnar JSON ({"features": [[...30 values...], ...]}) or raw little-endian
+    # float32 rows with X-Feature-Schema: fraud-v1; see GET /schemas/fraud-v1
+    try:
+        with span("parse"):
+            X = await FRAUD_SCHEMA.parse_request(request)
+    except SchemaError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    probabilities = await score_fraud(X)
+    return {"fraud_probability": probabilities.tolist()}
+
+@app.get("/schemas/{name}")
+async def get_feature_schema(name: str):
+    if name not in SCHEMAS:
+        raise HTTPException(status_code=404, detail=f"Unknown schema '{name}'")
+    return SCHEMAS[name].describe()
+
+@app.post("/fraud_text/")
+async def score_fraud_text(input_data: TextFraudInput):
+    # Repeated descriptions are served from the embedding LRU; only new ones
+    # go through FinBERT, batched with misses from concurrent requests
+    try:
+        probabilities = await get_scorer().score(input_data.descriptions)
+        return {
+            "predictions": [int(p >= 0.5) for p in probabilities],
+            "probabilities": [float(p) for p in probabilities],
+        }
+    except Exception as e:
+        logger.error(f"Text fraud scoring error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Text fraud scoring failed: {str(e)}")
 
 @app.post("/chat/")
 @limiter.limit("10/minute")
@@ -405,25 +620,32 @@ async def chat_with_ai(input_data: ChatInput, request: Request):
                 f"User: {user_message}"
             )
 
-        response = chat_model.generate_content(
-            [{"role": "user", "parts": [{"text": prompt}]}],
-            generation_config={"max_output_tokens": 500, "temperature": 0.7}
-        )
+        try:
+            with metrics.GEMINI_LATENCY.time(), span("gemini"):
+                response = chat_model.generate_content(
+                    [{"role": "user", "parts": [{"text": prompt}]}],
+                    generation_config={"max_output_tokens": 500, "temperature": 0.7}
+                )
+        except Exception:
+            metrics.GEMINI_ERRORS.inc()
+            raise
         response_text = response.text.strip()
         max_retries = 5
         for attempt in range(max_retries):
             try:
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-                c = conn.cursor()
-                c.execute(
-                    "INSERT INTO chat_history (session_id, user_id, mode, message, response) VALUES (?, ?, ?, ?, ?)",
-                    (input_data.session_id, input_data.user_id, input_data.mode, input_data.message, response_text)
-                )
-                conn.commit()
-                conn.close()
+                with span("db_write"):
+                    conn = sqlite3.connect(DB_PATH, timeout=10)
+                    c = conn.cursor()
+                    c.execute(
+                        "INSERT INTO chat_history (session_id, user_id, mode, message, response) VALUES (?, ?, ?, ?, ?)",
+                        (input_data.session_id, input_data.user_id, input_data.mode, input_data.message, response_text)
+                    )
+                    conn.commit()
+                    conn.close()
                 break
             except sqlite3.OperationalError as e:
                 if "database is locked" in str(e) and attempt < max_retries - 1:
+                    metrics.SQLITE_LOCK_RETRIES.labels("chat_insert").inc()
                     time.sleep(0.1 * (2 ** attempt))
                     continue
                 logger.error(f"Error saving chat history in chat_with_ai: {e}", exc_info=True)
@@ -468,6 +690,7 @@ async def get_chat_history(session_id: str, mode: str):
             return [{"message": h[0], "response": h[1], "timestamp": h[2]} for h in history]
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e) and attempt < max_retries - 1:
+                metrics.SQLITE_LOCK_RETRIES.labels("history_get").inc()
                 time.sleep(0.1 * (2 ** attempt))
                 continue
             logger.error(f"Error in get_chat_history: {e}", exc_info=True)
@@ -489,6 +712,7 @@ async def delete_chat_history(session_id: str, mode: str):
             return {"status": "deleted"}
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e) and attempt < max_retries - 1:
+                metrics.SQLITE_LOCK_RETRIES.labels("history_delete").inc()
                 time.sleep(0.1 * (2 ** attempt))
                 continue
             logger.error(f"Error in delete_chat_history: {e}", exc_info=True)
@@ -499,80 +723,211 @@ async def delete_chat_history(session_id: str, mode: str):
     return {"status": "error"}
 
         
+def compute_loan_stats():
+    df = pd.read_csv("loan_data.csv")
+    stats = {
+        "averageAge": float(df["Age"].mean()),
+        "averageIncome": float(df["Income"].mean()),
+        "averageLoanAmount": float(df["LoanAmount"].mean()),
+        "defaultRate": float(df["Default"].mean() * 100),
+        "defaultDistribution": [int((df["Default"] == 0).sum()), int((df["Default"] == 1).sum())],
+        "educationDistribution": df["Education"].value_counts().to_dict(),  # Raw counts
+        "employmentTypeDistribution": df["EmploymentType"].value_counts().to_dict(),
+        "maritalStatusDistribution": df["MaritalStatus"].value_counts().to_dict(),
+        "loanPurposeDistribution": df["LoanPurpose"].value_counts().to_dict(),
+    }
+    # Optionally decode using LoanInput valid values
+    education_map = {0: "high school", 1: "bachelor", 2: "master's", 3: "phd"}
+    employment_map = {0: "full-time", 1: "part-time", 2: "self-employed", 3: "unemployed"}
+    marital_map = {0: "single", 1: "married", 2: "divorced"}
+    loan_purpose_map = {0: "auto", 1: "business", 2: "education", 3: "home", 4: "other"}
+
+    stats["educationDistribution"] = {education_map[k]: v for k, v in stats["educationDistribution"].items()}
+    stats["employmentTypeDistribution"] = {employment_map[k]: v for k, v in stats["employmentTypeDistribution"].items()}
+    stats["maritalStatusDistribution"] = {marital_map[k]: v for k, v in stats["maritalStatusDistribution"].items()}
+    stats["loanPurposeDistribution"] = {loan_purpose_map[k]: v for k, v in stats["loanPurposeDistribution"].items()}
+
+    return stats
+
 @app.get("/stats/")
 async def stats():
     try:
-        df = pd.read_csv("loan_data.csv")
-        stats = {
-            "averageAge": float(df["Age"].mean()),
-            "averageIncome": float(df["Income"].mean()),
-            "averageLoanAmount": float(df["LoanAmount"].mean()),
-            "defaultRate": float(df["Default"].mean() * 100),
-            "defaultDistribution": [int((df["Default"] == 0).sum()), int((df["Default"] == 1).sum())],
-            "educationDistribution": df["Education"].value_counts().to_dict(),  # Raw counts
-            "employmentTypeDistribution": df["EmploymentType"].value_counts().to_dict(),
-            "maritalStatusDistribution": df["MaritalStatus"].value_counts().to_dict(),
-            "loanPurposeDistribution": df["LoanPurpose"].value_counts().to_dict(),
-        }
-        # Optionally decode using LoanInput valid values
-        education_map = {0: "high school", 1: "bachelor", 2: "master's", 3: "phd"}
-        employment_map = {0: "full-time", 1: "part-time", 2: "self-employed", 3: "unemployed"}
-        marital_map = {0: "single", 1: "married", 2: "divorced"}
-        loan_purpose_map = {0: "auto", 1: "business", 2: "education", 3: "home", 4: "other"}
-
-        stats["educationDistribution"] = {education_map[k]: v for k, v in stats["educationDistribution"].items()}
-        stats["employmentTypeDistribution"] = {employment_map[k]: v for k, v in stats["employmentTypeDistribution"].items()}
-        stats["maritalStatusDistribution"] = {marital_map[k]: v for k, v in stats["maritalStatusDistribution"].items()}
-        stats["loanPurposeDistribution"] = {loan_purpose_map[k]: v for k, v in stats["loanPurposeDistribution"].items()}
-
-        return stats
+        # Concurrent requests share one in-progress computation
+        return await stats_computations.do_async("loan", compute_loan_stats)
     except Exception as e:
         logger.error(f"Error in get_stats: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def compute_credit_risk_stats():
+    data = pd.read_csv("credit_risk_data_encoded.csv")  # Uses data_loader.py
+    encoders = load_credit_risk_encoders()
+    le_home = encoders["person_home_ownership"]
+    le_intent = encoders["loan_intent"]
+    le_grade = encoders["loan_grade"]
+    le_default = encoders["cb_person_default_on_file"]
+    logger.debug("LabelEncoders loaded")
+
+    logger.debug("Decoding distributions")
+    home_dist = {le_home.inverse_transform([int(k)])[0]: v for k, v in data["person_home_ownership"].value_counts().to_dict().items()}
+    intent_dist = {le_intent.inverse_transform([int(k)])[0]: v for k, v in data["loan_intent"].value_counts().to_dict().items()}
+    grade_dist = {le_grade.inverse_transform([int(k)])[0]: v for k, v in data["loan_grade"].value_counts().to_dict().items()}
+    default_dist = {le_default.inverse_transform([int(k)])[0]: v for k, v in data["cb_person_default_on_file"].value_counts().to_dict().items()}
+    logger.debug("Distributions decoded")
+
+    logger.debug("Computing loan_percent_income distribution")
+    loan_percent_dist = pd.cut(
+        data["loan_percent_income"],
+        bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        labels=["0-0.2", "0.2-0.4", "0.4-0.6", "0.6-0.8", "0.8-1.0"]
+    ).value_counts().sort_index().to_dict()
+    logger.debug(f"Loan percent income distribution: {loan_percent_dist}")
+
+    stats = {
+        "averageAge": float(data["person_age"].mean()),
+        "averageIncome": float(data["person_income"].mean()),
+        "averageLoanAmount": float(data["loan_amnt"].mean()),
+        "defaultRate": float(data["loan_status"].mean() * 100),
+        "defaultDistribution": [int((data["loan_status"] == 0).sum()), int((data["loan_status"] == 1).sum())],
+        "homeOwnershipDistribution": home_dist,
+        "loanIntentDistribution": intent_dist,
+        "loanGradeDistribution": grade_dist,
+        "defaultOnFileDistribution": default_dist,
+        "loanPercentIncomeDistribution": loan_percent_dist,
+    }
+    logger.debug("Stats computed successfully")
+    return stats
+
 @app.get("/credit_risk_stats/")
 async def credit_risk_stats():
     try:
-        data = pd.read_csv("credit_risk_data_encoded.csv")  # Uses data_loader.py
-        le_home = load_from_drive("le_person_home_ownership.pkl")
-        le_intent = load_from_drive("le_loan_intent.pkl")
-        le_grade = load_from_drive("le_loan_grade.pkl")
-        le_default = load_from_drive("le_cb_person_default_on_file.pkl")
-        logger.debug("LabelEncoders loaded")
-
-        logger.debug("Decoding distributions")
-        home_dist = {le_home.inverse_transform([int(k)])[0]: v for k, v in data["person_home_ownership"].value_counts().to_dict().items()}
-        intent_dist = {le_intent.inverse_transform([int(k)])[0]: v for k, v in data["loan_intent"].value_counts().to_dict().items()}
-        grade_dist = {le_grade.inverse_transform([int(k)])[0]: v for k, v in data["loan_grade"].value_counts().to_dict().items()}
-        default_dist = {le_default.inverse_transform([int(k)])[0]: v for k, v in data["cb_person_default_on_file"].value_counts().to_dict().items()}
-        logger.debug("Distributions decoded")
-
-        logger.debug("Computing loan_percent_income distribution")
-        loan_percent_dist = pd.cut(
-            data["loan_percent_income"],
-            bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0],
-            labels=["0-0.2", "0.2-0.4", "0.4-0.6", "0.6-0.8", "0.8-1.0"]
-        ).value_counts().sort_index().to_dict()
-        logger.debug(f"Loan percent income distribution: {loan_percent_dist}")
-
-        stats = {
-            "averageAge": float(data["person_age"].mean()),
-            "averageIncome": float(data["person_income"].mean()),
-            "averageLoanAmount": float(data["loan_amnt"].mean()),
-            "defaultRate": float(data["loan_status"].mean() * 100),
-            "defaultDistribution": [int((data["loan_status"] == 0).sum()), int((data["loan_status"] == 1).sum())],
-            "homeOwnershipDistribution": home_dist,
-            "loanIntentDistribution": intent_dist,
-            "loanGradeDistribution": grade_dist,
-            "defaultOnFileDistribution": default_dist,
-            "loanPercentIncomeDistribution": loan_percent_dist,
-        }
-        logger.debug("Stats computed successfully")
-        return stats
+        # Concurrent requests share one in-progress computation
+        return await stats_computations.do_async("credit_risk", compute_credit_risk_stats)
     except Exception as e:
         logger.error(f"Error in credit_risk_stats: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error calculating credit risk stats: {str(e)}")
     
+@app.get("/artifact_stats/")
+async def artifact_stats(request: Request):
+    # This worker's per-backend open latency, misses and read throughput; the
+    # all-worker view is artifact_opens_total / artifact_download_* in /metrics
+    _require_admin(request)
+    return get_store().stats()
+
+@app.get("/loader_stats/")
+async def loader_stats(request: Request):
+    # This worker's loads executed vs. requests coalesced onto an in-progress
+    # load, per group; the all-worker view is singleflight_* in /metrics
+    _require_admin(request)
+    return singleflight.all_stats()
+
+@app.get("/text_scoring_stats/")
+async def text_scoring_stats(request: Request):
+    # This worker's embedding cache hit rate, micro-batch sizes and encoder
+    # time; the all-worker view is text_* and cache_requests_total in /metrics
+    _require_admin(request)
+    return get_scorer().stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+def _require_admin(request: Request):
+    if not tracing.is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/admin/profiler")
+async def profiler_report(request: Request, limit: int = 30, sort: str = "cumulative"):
+    # Aggregated cProfile output of every profiled request in this worker
+    _require_admin(request)
+    return {**tracing.profiler.status(), "report": tracing.profiler.report(limit, sort)}
+
+@app.post("/admin/profiler")
+async def configure_profiler(config: ProfilerConfig, request: Request):
+    _require_admin(request)
+    tracing.profiler.sample_rate = config.sample_rate
+    return tracing.profiler.status()
+
+@app.post("/admin/profiler/dump")
+async def dump_profile(request: Request):
+    # Writes a .prof file for snakeviz/pstats; returns its path on the server
+    _require_admin(request)
+    path = tracing.profiler.dump()
+    if path is None:
+        raise HTTPException(status_code=404, detail="No profiled requests yet")
+    return {"path": path}
+
+@app.delete("/admin/profiler")
+async def reset_profiler(request: Request):
+    _require_admin(request)
+    tracing.profiler.reset()
+    return tracing.profiler.status()
+
+def _require_model(name):
+    if name not in registry.specs:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{name}'")
+
+@app.get("/admin/models")
+async def model_status(request: Request):
+    _require_admin(request)
+    return registry.status()
+
+@app.post("/admin/models/{name}/candidate")
+async def stage_model(name: str, candidate: ModelCandidate, request: Request):
+    # Loads and canary-checks a new artifact set while the current version keeps serving
+    _require_admin(request)
+    _require_model(name)
+    try:
+        version = await registry.stage(name, candidate.version, {"model": candidate.model_file, "scaler": candidate.scaler_file},
+                                       candidate.file_ids, candidate.shadow_fraction)
+    except ValueError as e:
+        # Failed canary check, or the version is already serving
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error staging {name} {candidate.version}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to load {name} {candidate.version}: {str(e)}")
+    return version.describe()
+
+@app.post("/admin/models/{name}/shadow")
+async def configure_shadow(name: str, config: ShadowConfig, request: Request):
+    _require_admin(request)
+    _require_model(name)
+    try:
+        registry.set_shadow_fraction(name, config.shadow_fraction)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No candidate staged for {name}")
+    return registry.status()[name]
+
+@app.delete("/admin/models/{name}/candidate")
+async def discard_model(name: str, request: Request):
+    _require_admin(request)
+    _require_model(name)
+    try:
+        registry.discard(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No candidate staged for {name}")
+    return registry.status()[name]
+
+@app.post("/admin/models/{name}/promote")
+async def promote_model(name: str, request: Request):
+    _require_admin(request)
+    _require_model(name)
+    try:
+        registry.promote(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No candidate staged for {name}")
+    return registry.status()[name]
+
+@app.post("/admin/models/{name}/rollback")
+async def rollback_model(name: str, request: Request):
+    _require_admin(request)
+    _require_model(name)
+    try:
+        registry.rollback(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"No previous version of {name} in this worker")
+    return registry.status()[name]
+
 @app.get("/")
 async def health_check():
     return {"status": "healthy"}
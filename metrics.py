@@ -0,0 +1,100 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from starlette.routing import Match
+
+# Prometheus metrics for the API. With several workers (uvicorn --workers,
+# gunicorn), set PROMETHEUS_MULTIPROC_DIR to an empty directory before the
+# workers start. Every process then writes its samples there and /metrics
+# aggregates across all of them, whichever worker answers the scrape.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled by route",
+                             ["method", "route"], multiprocess_mode="livesum")
+MODEL_LOADS = Counter("model_loads_total", "Model/scaler loads by outcome", ["model", "outcome"])
+MODEL_LOAD_SECONDS = Histogram("model_load_duration_seconds", "Time to download and deserialize a model and its scaler",
+                               ["model"], buckets=LATENCY_BUCKETS)
+ARTIFACT_BYTES = Counter("artifact_download_bytes_total", "Bytes read from artifact stores", ["store"])
+ARTIFACT_SECONDS = Counter("artifact_download_seconds_total", "Time spent opening and reading artifacts", ["store"])
+ARTIFACT_OPENS = Counter("artifact_opens_total", "Artifact open attempts by result", ["store", "result"])
+GEMINI_LATENCY = Histogram("gemini_request_duration_seconds", "Gemini generate_content latency", buckets=LATENCY_BUCKETS)
+GEMINI_ERRORS = Counter("gemini_errors_total", "Failed Gemini calls")
+SQLITE_LOCK_RETRIES = Counter("sqlite_lock_retries_total", "Retries after 'database is locked'", ["operation"])
+SHADOW_PREDICTIONS = Counter("shadow_predictions_total", "Rows scored by a shadow candidate model by result", ["model", "result"])
+SHADOW_ABS_DELTA = Histogram("shadow_abs_delta", "|candidate - serving| probability per shadow-scored row", ["model"],
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0))
+LOG_RECORDS_DROPPED = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by result; hit ratio = hit / (hit + miss)",
+                         ["cache", "result"])
+SINGLEFLIGHT_CALLS = Counter("singleflight_calls_total", "Load calls by group; result=coalesced joined a load already in progress",
+                             ["group", "result"])
+SINGLEFLIGHT_ERRORS = Counter("singleflight_errors_total", "Loads that raised, by group", ["group"])
+SINGLEFLIGHT_SECONDS = Counter("singleflight_load_seconds_total", "Time spent running loads, by group", ["group"])
+SINGLEFLIGHT_IN_FLIGHT = Gauge("singleflight_in_flight", "Loads running now, by group", ["group"], multiprocess_mode="livesum")
+TEXT_BATCH_SIZE = Histogram("text_embedding_batch_size", "Distinct texts per FinBERT pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+TEXT_ENCODER_SECONDS = Histogram("text_encoder_duration_seconds", "FinBERT forward pass time per batch", buckets=LATENCY_BUCKETS)
+TEXT_COALESCED = Counter("text_embeddings_coalesced_total", "Cache misses that joined an embedding already queued for the same text")
+EXPLAIN_ROWS = Counter("explanation_rows_total", "Rows explained (cache misses) by model and SHAP method", ["model", "method"])
+EXPLAIN_SECONDS = Counter("explanation_seconds_total", "Time in shap_values by model and method; / explanation_rows_total = seconds per row",
+                          ["model", "method"])
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+class ModelLoadTimer:
+    # with ModelLoadTimer("loan_model.pkl"): ... counts the load and its duration
+    def __init__(self, model):
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        MODEL_LOAD_SECONDS.labels(self.model).observe(time.perf_counter() - self.start)
+        MODEL_LOADS.labels(self.model, "error" if exc_type else "ok").inc()
+        return False
+
+def _route_of(app, scope):
+    # Route template rather than the raw path, so IDs in URLs don't create new series
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+def instrument(app):
+    @app.middleware("http")
+    async def record_request_metrics(request, call_next):
+        route = _route_of(app, request.scope)
+        method = request.method
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            in_progress.dec()
+
+def render():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid):
+    # Call from the process manager's child-exit hook so a dead worker's live gauges are dropped
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
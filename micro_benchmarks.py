@@ -0,0 +1,189 @@
+import argparse
+import io
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+# Component-level timings for the per-request hot paths: input validation,
+# preprocessing, forest inference, the LSTM forward pass on the model the
+# registry builds once per version (and that build on its own), and
+# artifact deserialization, at batch sizes 1, 64 and 4096. Each case is
+# auto-calibrated to run for at least --min-time per repeat. The report gives
+# a summary over the repeats and is tagged with the git commit. --compare
+# prints the change in median against an earlier report, with changes inside
+# the measured noise marked as such.
+
+BATCH_SIZES = [1, 64, 4096]
+
+def timeit(fn, repeats=7, min_time=0.05):
+    # Calibrate loops per repeat, then return per-call seconds for each repeat
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return samples, loops
+
+def summarize(samples, loops, batch_size):
+    q1, median, q3 = (float(q) for q in np.percentile(samples, [25, 50, 75]))
+    return {
+        "batch_size": batch_size,
+        "loops": loops,
+        "repeats": len(samples),
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "stdev_us": (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e6,
+        "min_us": min(samples) * 1e6,
+        "median_us": median * 1e6,
+        "iqr_us": (q3 - q1) * 1e6,
+        "per_item_us": median * 1e6 / batch_size if batch_size else median * 1e6,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build_cases(artifact_dir, batch_sizes):
+    # Imports happen here, after ARTIFACT_STORES/ARTIFACT_DIR are set
+    import pandas as pd
+    import torch
+    from main import LoanInput, CreditRiskInput, FraudInput, build_fraud_model
+    from preprocessing import preprocess_input, load_credit_risk_encoders
+    from load_test import LOAN_SAMPLE, CREDIT_RISK_SAMPLE, FRAUD_SAMPLE
+
+    def load(name):
+        with open(os.path.join(artifact_dir, name), "rb") as f:
+            return pickle.load(f)
+
+    loan_model, loan_scaler = load("loan_model.pkl"), load("scaler.pkl")
+    credit_model, credit_scaler = load("credit_risk_model.pkl"), load("credit_risk_scaler.pkl")
+    fraud_scaler = load("fraud_scaler.pkl")
+    state_dict = torch.load(os.path.join(artifact_dir, "lstm_fraud_model.pth"), map_location="cpu")
+    input_dim = state_dict["lstm.weight_ih_l0"].shape[1]
+    fraud_model = build_fraud_model(state_dict)
+    load_credit_risk_encoders()
+    rng = np.random.default_rng(0)
+
+    # Paid once per model version on load or promotion, not per request
+    cases = {"lstm_build": (0, lambda: build_fraud_model(state_dict))}
+    for n in batch_sizes:
+        loan_rows = [LOAN_SAMPLE] * n
+        loan_frame = pd.DataFrame(loan_rows)
+        credit_rows = [CREDIT_RISK_SAMPLE] * n
+        fraud_rows = [FRAUD_SAMPLE] * n
+        loan_X = preprocess_input(loan_frame, loan_scaler, model_type='loan_default')
+        credit_X = np.array([preprocess_input(CREDIT_RISK_SAMPLE, credit_scaler, model_type='credit_risk')] * n)
+        fraud_X = torch.FloatTensor(fraud_scaler.transform(rng.normal(size=(n, input_dim)))).unsqueeze(1)
+
+        cases[f"validate_loan_input[{n}]"] = (n, lambda rows=loan_rows: [LoanInput.model_validate(r) for r in rows])
+        cases[f"validate_credit_risk_input[{n}]"] = (n, lambda rows=credit_rows: [CreditRiskInput.model_validate(r) for r in rows])
+        cases[f"validate_fraud_input[{n}]"] = (n, lambda rows=fraud_rows: [FraudInput.model_validate(r) for r in rows])
+        cases[f"preprocess_loan[{n}]"] = (n, lambda df=loan_frame: preprocess_input(df, loan_scaler, model_type='loan_default'))
+        # The credit-risk path takes one dict per call, as the endpoint does
+        cases[f"preprocess_credit_risk[{n}]"] = (n, lambda rows=credit_rows: [preprocess_input(r, credit_scaler, model_type='credit_risk') for r in rows])
+        cases[f"loan_predict[{n}]"] = (n, lambda X=loan_X: loan_model.predict(X))
+        cases[f"loan_predict_proba[{n}]"] = (n, lambda X=loan_X: loan_model.predict_proba(X))
+        cases[f"credit_risk_predict[{n}]"] = (n, lambda X=credit_X: credit_model.predict(X))
+        cases[f"credit_risk_predict_proba[{n}]"] = (n, lambda X=credit_X: credit_model.predict_proba(X))
+
+        def lstm_forward(X=fraud_X):
+            # What /fraud/ and /fraud/batch/ run per request on the serving version's model
+            with torch.no_grad():
+                return fraud_model(X)
+        cases[f"lstm_forward[{n}]"] = (n, lstm_forward)
+
+    for name in sorted(os.listdir(artifact_dir)):
+        with open(os.path.join(artifact_dir, name), "rb") as f:
+            payload = f.read()
+        if name.endswith(".pkl"):
+            cases[f"unpickle[{name}]"] = (0, lambda p=payload: pickle.loads(p))
+        elif name.endswith(".pth"):
+            cases[f"torch_load[{name}]"] = (0, lambda p=payload: torch.load(io.BytesIO(p), map_location="cpu"))
+    return cases
+
+def run(cases, repeats, min_time, pattern=None):
+    results = {}
+    for name, (batch_size, fn) in cases.items():
+        if pattern and pattern not in name:
+            continue
+        samples, loops = timeit(fn, repeats, min_time)
+        results[name] = summarize(samples, loops, batch_size)
+        print(f"{name:45s} median {results[name]['median_us']:12.1f} us  iqr {results[name]['iqr_us']:10.1f} us", file=sys.stderr)
+    return results
+
+def compare(current, previous):
+    # Relative change in median; a change smaller than the combined relative
+    # IQR of both runs is reported as noise
+    rows = []
+    for name, now in current["results"].items():
+        before = previous["results"].get(name)
+        if before is None:
+            continue
+        change = now["median_us"] / before["median_us"] - 1
+        noise = now["iqr_us"] / now["median_us"] + before["iqr_us"] / before["median_us"]
+        rows.append({"name": name, "before_us": before["median_us"], "after_us": now["median_us"],
+                     "change": change, "significant": bool(abs(change) > noise)})
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for preprocessing, inference and artifact loading")
+    parser.add_argument("--artifacts", default=None, help="Directory with real model artifacts (default: generated fixtures)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per repeat")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="Earlier report to compare medians against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        artifact_dir = args.artifacts or os.path.join(work_dir, "artifacts")
+        os.environ.setdefault("GEMINI_API_KEY", "micro-benchmark")
+        os.environ.update({"ARTIFACT_STORES": "local", "ARTIFACT_DIR": artifact_dir,
+                           "DB_PATH": os.path.join(work_dir, "chat_history.db")})
+        if args.artifacts is None:
+            from load_test import build_fixtures
+            build_fixtures(artifact_dir)
+        import torch
+        # preprocess_input's pandas dtype FutureWarnings would be timed and printed on every call
+        warnings.simplefilter("ignore", FutureWarning)
+        cases = build_cases(artifact_dir, args.batch_sizes)
+        report = {
+            "commit": git_commit(),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "torch_threads": torch.get_num_threads(), "numpy": np.__version__},
+            "artifacts": "fixtures" if args.artifacts is None else args.artifacts,
+            "results": run(cases, args.repeats, args.min_time, args.filter),
+        }
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+        for row in report["comparison"]:
+            flag = "" if row["significant"] else " (noise)"
+            print(f"{row['name']:45s} {row['before_us']:12.1f} -> {row['after_us']:12.1f} us  {row['change']:+7.1%}{flag}", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -1,9 +1,8 @@
+import os
 import pickle
 import torch
 from io import BytesIO
-import requests
-from bs4 import BeautifulSoup
-import re
+from artifact_store import get_store, register_file_id
 
 # Map filenames to Google Drive file IDs (fill in the actual IDs)
 MODEL_FILE_IDS = {
@@ -17,63 +16,27 @@ MODEL_FILE_IDS = {
     "loan_model.pkl": "1wgFVXQQmGVQw6qCjN9HYWBBZqrM2Z1Qz",
     "lstm_fraud_model.pth": "1o1nAMcHtK7afWqQeCncS8XRpN1HG2_Za",
     "scaler.pkl": "1qq8hP4-RAXX2iIKhhmTDYGybc6xjngYQ",
+    # Not uploaded to Drive yet; served from ARTIFACT_DIR or the mirror until an ID is set
+    "finbert_classifier.pkl": os.getenv("FINBERT_CLASSIFIER_FILE_ID", ""),
+    # Built by `python drift.py` from the training CSVs
+    "drift_reference.json": os.getenv("DRIFT_REFERENCE_FILE_ID", ""),
 }
 
+def register_artifact(file_name, file_id=None):
+    # New model versions are served from ARTIFACT_DIR or the mirror; a Drive ID is only needed for Drive
+    MODEL_FILE_IDS[file_name] = file_id or MODEL_FILE_IDS.get(file_name, "")
+    if file_id:
+        register_file_id(file_name, file_id)
+
 def load_from_drive(file_name, is_torch=False):
-    file_id = MODEL_FILE_IDS.get(file_name)
-    if not file_id:
+    if file_name not in MODEL_FILE_IDS:
         raise ValueError(f"No file ID found for {file_name}")
-    
-    base_url = "https://drive.google.com/uc"
-    session = requests.Session()
-    params = {
-        "export": "download",
-        "id": file_id
-    }
-    response = session.get(base_url, params=params, stream=True)
-    
-    # If no Content-Disposition, it's likely the warning page - handle confirmation
-    if "content-disposition" not in response.headers:
-        token = None
-        for k, v in response.cookies.items():
-            if k.startswith("download_warning"):
-                token = v
-                break
-        
-        if not token:
-            soup = BeautifulSoup(response.text, "html.parser")
-            download_form = soup.find("form", {"id": "download-form"})
-            if download_form and download_form.get("action"):
-                download_url = download_form["action"]
-                hidden_inputs = download_form.find_all("input", {"type": "hidden"})
-                form_params = {}
-                for inp in hidden_inputs:
-                    if inp.get("name") and inp.get("value") is not None:
-                        form_params[inp["name"]] = inp["value"]
-                response = session.get(download_url, params=form_params, stream=True)
-            else:
-                match = re.search(r'confirm=([0-9A-Za-z-_]+)', response.text)
-                if match:
-                    token = match.group(1)
-                    params["confirm"] = token
-                    response = session.get(base_url, params=params, stream=True)
-                else:
-                    raise Exception("Unable to find download confirmation token or form. Ensure the file is shared publicly with 'Anyone with the link'.")
+
+    # Served by the configured store chain (local dir -> HTTP mirror -> Drive)
+    with get_store().open(file_name) as f:
+        if is_torch:
+            # torch.load needs a seekable file; remote bodies are buffered first
+            content = f if f.seekable() else BytesIO(f.read())
+            return torch.load(content, map_location=torch.device('cpu'))
         else:
-            params["confirm"] = token
-            response = session.get(base_url, params=params, stream=True)
-    
-    # Load the content into memory
-    content = BytesIO()
-    for chunk in response.iter_content(chunk_size=32768):
-        if chunk:
-            content.write(chunk)
-    content.seek(0)
-    
-    if response.status_code != 200:
-        raise ValueError(f"Failed to download {file_name}: {response.status_code} - {content.read().decode('utf-8')}")
-    
-    if is_torch:
-        return torch.load(content, map_location=torch.device('cpu'))
-    else:
-        return pickle.load(content)
\ No newline at end of file
+            return pickle.load(f)
@@ -0,0 +1,357 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+from model_loader import load_from_drive, register_artifact
+from singleflight import SingleFlight
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Versioned serving references for the scoring models. Each request takes the
+# current ModelVersion once and uses only that object, so a swap never
+# changes a model mid-request. Requests already running finish on the old
+# version, and the next request gets the new one.
+#
+# A new version is loaded on a worker thread and must score the model's
+# canary inputs with valid probabilities before it can serve. With
+# MODEL_CANARY_MAX_DELTA it must also stay within that distance of the
+# serving version. It is first installed as a candidate. A candidate with a
+# shadow fraction also scores that share of live traffic on a single
+# background thread, and how often it disagrees is reported. Promotion swaps
+# the reference. The replaced version stays loaded so rollback is instant.
+#
+# Workers share the desired state through MODEL_REGISTRY_PATH. The worker
+# that handles an admin call writes the file, and every worker checks it
+# every MODEL_REGISTRY_POLL_SECONDS and loads whatever it is missing.
+# Writes take an exclusive lock on MODEL_REGISTRY_PATH.lock around the
+# read-modify-replace, so concurrent admin calls on two workers both land.
+#
+# Artifacts are resolved by file name through the artifact store, and local
+# copies take precedence. A new version therefore needs new file names. A
+# candidate reusing the serving model's file would load the cached old model.
+
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH", "data/model_registry.json")
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", "10"))
+MODEL_CANARY_MAX_DELTA = float(os.getenv("MODEL_CANARY_MAX_DELTA", "1.0"))
+MODEL_SHADOW_MAX_PENDING = int(os.getenv("MODEL_SHADOW_MAX_PENDING", "32"))
+
+class CanaryError(ValueError):
+    pass
+
+class ModelVersion:
+    def __init__(self, name, version, artifacts, model, scaler, file_ids=None):
+        self.name = name
+        self.version = version
+        self.artifacts = dict(artifacts)
+        self.file_ids = dict(file_ids or {})
+        self.model = model
+        self.scaler = scaler
+        self.loaded_at = time.time()
+        self.canary = None
+
+    def spec(self):
+        # What the state file records, enough for another worker to load the same version
+        return {"version": self.version, "artifacts": self.artifacts, "file_ids": self.file_ids}
+
+    def describe(self):
+        return {**self.spec(), "loaded_at": self.loaded_at, "canary": self.canary}
+
+class ModelSpec:
+    # predict(version, inputs) -> P(class 1) per input; it is also how canary and shadow inputs are scored
+    def __init__(self, name, artifacts, predict, canary, is_torch=False, prepare=None):
+        self.name = name
+        self.artifacts = artifacts
+        self.predict = predict
+        self.canary = canary
+        self.is_torch = is_torch
+        self.prepare = prepare
+
+class ModelRegistry:
+    def __init__(self, path=MODEL_REGISTRY_PATH):
+        self.path = path
+        self.specs = {}
+        self._serving = {}
+        self._previous = {}
+        self._candidates = {}
+        self._errors = {}
+        self._shadow_stats = {}
+        self._loads = SingleFlight("models")
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._shadow_pending = 0
+        self._shadow_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._state_mtime = None
+        self._watcher = None
+
+    def register(self, name, artifacts, predict, canary, is_torch=False, prepare=None):
+        self.specs[name] = ModelSpec(name, artifacts, predict, canary, is_torch, prepare)
+        self._shadow_stats[name] = {"scored": 0, "errors": 0, "skipped": 0, "disagreements": 0, "abs_delta_sum": 0.0}
+
+    # Loading and validation run on worker threads
+
+    def _load(self, name, spec):
+        model_spec = self.specs[name]
+        artifacts = {**model_spec.artifacts, **spec.get("artifacts", {})}
+        file_ids = spec.get("file_ids") or {}
+        for file_name in artifacts.values():
+            register_artifact(file_name, file_ids.get(file_name))
+        with metrics.ModelLoadTimer(artifacts["model"]):
+            model = load_from_drive(artifacts["model"], is_torch=model_spec.is_torch)
+            scaler = load_from_drive(artifacts["scaler"])
+        if model_spec.prepare is not None:
+            model = model_spec.prepare(model)
+        version = ModelVersion(name, spec.get("version", "default"), artifacts, model, scaler, file_ids)
+        version.canary = self._validate(version)
+        logger.info(f"Loaded {name} {version.version} from {artifacts}")
+        return version
+
+    def _validate(self, candidate):
+        model_spec = self.specs[candidate.name]
+        rows = len(model_spec.canary)
+        try:
+            probabilities = np.asarray(model_spec.predict(candidate, model_spec.canary), dtype=np.float64).ravel()
+        except Exception as e:
+            raise CanaryError(f"{candidate.name} {candidate.version} failed on canary inputs: {e}") from e
+        if probabilities.shape != (rows,) or not np.isfinite(probabilities).all() \
+                or (probabilities < 0).any() or (probabilities > 1).any():
+            raise CanaryError(f"{candidate.name} {candidate.version} returned invalid canary probabilities: {probabilities.tolist()}")
+        report = {"rows": rows, "probabilities": np.round(probabilities, 4).tolist()}
+        serving = self._serving.get(candidate.name)
+        if serving is not None and serving is not candidate:
+            baseline = np.asarray(model_spec.predict(serving, model_spec.canary), dtype=np.float64).ravel()
+            delta = float(np.abs(probabilities - baseline).max())
+            report.update(serving_version=serving.version, max_abs_delta=delta)
+            if delta > MODEL_CANARY_MAX_DELTA:
+                raise CanaryError(f"{candidate.name} {candidate.version} moved canary probabilities by {delta:.3f} "
+                                  f"from {serving.version}; the limit is {MODEL_CANARY_MAX_DELTA}")
+        return report
+
+    def _load_initial(self, name):
+        version = self._serving.get(name)
+        if version is None:
+            desired = self._read_state().get(name, {}).get("serving", {})
+            version = self._load(name, desired)
+            self._serving[name] = version
+        return version
+
+    async def _load_version(self, name, spec):
+        # A version that is already loaded here as candidate or previous is reused
+        for local in (self._candidates.get(name, (None,))[0], self._previous.get(name), self._serving.get(name)):
+            if local is not None and local.version == spec.get("version", "default"):
+                return local
+        try:
+            version = await self._loads.do_async((name, spec.get("version", "default")), self._load, name, spec)
+        except Exception as e:
+            self._errors[name] = str(e)
+            raise
+        self._errors.pop(name, None)
+        return version
+
+    # Serving path
+
+    async def get(self, name):
+        version = self._serving.get(name)
+        metrics.cache_lookup("models", version is not None)
+        if version is None:
+            version = await self._loads.do_async(name, self._load_initial, name)
+        return version
+
+    def shadow(self, name, inputs, primary):
+        # Never blocks the caller: sampled, queued, and skipped when the shadow thread is behind
+        entry = self._candidates.get(name)
+        if entry is None:
+            return
+        candidate, fraction = entry
+        if fraction <= 0 or random.random() >= fraction:
+            return
+        with self._shadow_lock:
+            if self._shadow_pending >= MODEL_SHADOW_MAX_PENDING:
+                self._shadow_stats[name]["skipped"] += 1
+                metrics.SHADOW_PREDICTIONS.labels(name, "skipped").inc()
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._score_shadow, name, candidate, inputs, np.asarray(primary, dtype=np.float64))
+
+    def _score_shadow(self, name, candidate, inputs, primary):
+        stats = self._shadow_stats[name]
+        try:
+            probabilities = np.asarray(self.specs[name].predict(candidate, inputs), dtype=np.float64).ravel()
+            delta = np.abs(probabilities - primary)
+            stats["scored"] += len(delta)
+            stats["abs_delta_sum"] += float(delta.sum())
+            stats["disagreements"] += int(((probabilities >= 0.5) != (primary >= 0.5)).sum())
+            metrics.SHADOW_PREDICTIONS.labels(name, "ok").inc(len(delta))
+            for value in delta:
+                metrics.SHADOW_ABS_DELTA.labels(name).observe(value)
+        except Exception as e:
+            stats["errors"] += 1
+            metrics.SHADOW_PREDICTIONS.labels(name, "error").inc()
+            logger.warning(f"Shadow scoring of {name} {candidate.version} failed: {e}")
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    # Admin operations; each updates this worker, then the shared state file
+
+    async def stage(self, name, version, artifacts, file_ids=None, shadow_fraction=0.0):
+        if name not in self.specs:
+            raise KeyError(name)
+        # Load what is serving first, so the canary has something to compare against
+        serving = await self.get(name)
+        self._check_artifacts(name, serving, {**self.specs[name].artifacts, **artifacts}, file_ids or {})
+        candidate = await self._load_version(name, {"version": version, "artifacts": artifacts, "file_ids": file_ids})
+        if candidate is self._serving.get(name):
+            raise ValueError(f"{name} {version} is already serving")
+        self._candidates[name] = (candidate, shadow_fraction)
+        self._shadow_stats[name].update(scored=0, errors=0, skipped=0, disagreements=0, abs_delta_sum=0.0)
+        self._write_state(name)
+        return candidate
+
+    def _check_artifacts(self, name, serving, artifacts, file_ids):
+        # Checked before loading: registering a file ID repoints that name for every version in this process
+        if artifacts["model"] == serving.artifacts["model"]:
+            raise ValueError(f"{artifacts['model']} is the serving {name} model; upload the new version under a new file name")
+        for version in (serving, self._previous.get(name)):
+            if version is None:
+                continue
+            for file_name, file_id in file_ids.items():
+                if file_name in version.artifacts.values() and version.file_ids.get(file_name) != file_id:
+                    raise ValueError(f"{file_name} is already used by {name} {version.version}; "
+                                     f"a different file ID needs a different file name")
+
+    def set_shadow_fraction(self, name, fraction):
+        candidate, _ = self._candidates[name]
+        self._candidates[name] = (candidate, fraction)
+        self._write_state(name)
+
+    def discard(self, name):
+        self._candidates.pop(name)
+        self._write_state(name)
+
+    def _swap(self, name, version):
+        previous = self._serving.get(name)
+        # The swap itself is one reference assignment
+        self._serving[name] = version
+        if previous is not None and previous is not version:
+            self._previous[name] = previous
+        logger.info(f"{name} now serving {version.version}" + (f" (was {previous.version})" if previous else ""))
+
+    def promote(self, name):
+        candidate, _ = self._candidates.pop(name)
+        self._swap(name, candidate)
+        self._write_state(name)
+        return candidate
+
+    def rollback(self, name):
+        previous = self._previous[name]
+        self._swap(name, previous)
+        self._write_state(name)
+        return previous
+
+    # Shared state
+
+    def _read_state(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model registry state {self.path}: {e}")
+            return {}
+
+    def _write_state(self, name):
+        # Only this model's entry is rewritten, so models other workers changed are kept
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._state_lock, open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                # Released when the lock file is closed
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._read_state()
+            entry = {}
+            if name in self._serving:
+                entry["serving"] = self._serving[name].spec()
+            if name in self._candidates:
+                candidate, fraction = self._candidates[name]
+                entry["candidate"] = {**candidate.spec(), "shadow_fraction": fraction}
+            if name in self._previous:
+                entry["previous"] = self._previous[name].spec()
+            state[name] = entry
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._state_mtime = os.stat(self.path).st_mtime_ns
+
+    async def reconcile(self):
+        # Bring this worker in line with the state file; failures keep the current version
+        for name, entry in self._read_state().items():
+            if name not in self.specs:
+                continue
+            try:
+                desired = entry.get("serving")
+                current = self._serving.get(name)
+                # Models this worker has not loaded yet pick the desired version up on first use
+                if desired and current is not None and desired["version"] != current.version:
+                    self._swap(name, await self._load_version(name, desired))
+                desired_candidate = entry.get("candidate")
+                if desired_candidate is None:
+                    self._candidates.pop(name, None)
+                else:
+                    local = self._candidates.get(name)
+                    if local is None or local[0].version != desired_candidate["version"]:
+                        candidate = await self._load_version(name, desired_candidate)
+                    else:
+                        candidate = local[0]
+                    self._candidates[name] = (candidate, desired_candidate.get("shadow_fraction", 0.0))
+            except Exception as e:
+                logger.error(f"Could not apply model registry state for {name}: {e}")
+
+    async def watch(self, interval=MODEL_REGISTRY_POLL_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if mtime != self._state_mtime:
+                self._state_mtime = mtime
+                await self.reconcile()
+
+    def start_watcher(self):
+        if MODEL_REGISTRY_POLL_SECONDS > 0 and self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self.watch())
+
+    def status(self):
+        result = {}
+        for name in self.specs:
+            serving = self._serving.get(name)
+            candidate = self._candidates.get(name)
+            previous = self._previous.get(name)
+            stats = dict(self._shadow_stats[name])
+            stats["mean_abs_delta"] = stats.pop("abs_delta_sum") / stats["scored"] if stats["scored"] else None
+            result[name] = {
+                "serving": serving.describe() if serving else None,
+                "candidate": {**candidate[0].describe(), "shadow_fraction": candidate[1]} if candidate else None,
+                "previous": previous.version if previous else None,
+                "shadow": stats,
+                "error": self._errors.get(name),
+            }
+        return result
+
+registry = ModelRegistry()
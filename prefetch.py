@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from drive import DOWNLOAD_DIR, drive_response
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 4))
+PREFETCH_RETRIES = int(os.getenv("PREFETCH_RETRIES", 3))
+CHUNK_SIZE = 1 << 16
+
+def create_session(pool_size=PREFETCH_WORKERS):
+    # One keep-alive pool shared by every worker thread
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def all_files():
+    from model_loader import MODEL_FILE_IDS
+    from data_loader import CSV_FILE_IDS
+    # Artifacts without a Drive ID can only come from the local dir or mirror
+    return {name: file_id for name, file_id in {**MODEL_FILE_IDS, **CSV_FILE_IDS}.items() if file_id}
+
+def _backoff(attempt, base=0.5, cap=10.0):
+    # Full jitter keeps retrying workers from hitting Drive in lockstep
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _content_range(response):
+    # "bytes 100-199/200" -> (100, 200); "bytes */200" -> (None, 200)
+    match = re.match(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)", response.headers.get("content-range", ""))
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start else None), (int(total) if total != "*" else None)
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _discard_partial(part_path):
+    for path in (part_path, f"{part_path}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _download(session, file_name, file_id, part_path, base_url):
+    # A .part is only resumed together with its .part.json: the validator
+    # (ETag or Last-Modified) and total size of the file it is a prefix of
+    meta_path = f"{part_path}.json"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _read_meta(meta_path) if offset else {}
+    headers = None
+    if offset and meta.get("validator"):
+        # If-Range: the server answers 206 only while the file is unchanged, else the whole new file
+        headers = {"Range": f"bytes={offset}-", "If-Range": meta["validator"]}
+    elif offset and meta.get("total"):
+        headers = {"Range": f"bytes={offset}-"}
+    else:
+        offset = 0
+    response = drive_response(session, file_id, file_name, headers=headers, base_url=base_url)
+    try:
+        start, total = _content_range(response)
+        if response.status_code == 416 and offset:
+            # Range starts at EOF: complete only if the file is still the one the .part came from
+            if total is not None and total == offset == meta.get("total"):
+                return 0, offset
+            _discard_partial(part_path)
+            raise IOError(f"Partial download of {file_name} does not match the current file; starting over")
+        if response.status_code not in (200, 206):
+            raise ValueError(f"Failed to download {file_name}: {response.status_code}")
+        if response.headers.get("content-type", "").startswith("text/html"):
+            # Drive's confirmation or error page; never let it stand in for the artifact
+            raise ValueError(f"Got an HTML page instead of {file_name}")
+        if response.status_code == 206:
+            if start != offset or (meta.get("total") and total != meta["total"]):
+                _discard_partial(part_path)
+                raise IOError(f"Server resumed {file_name} at a different offset or size; starting over")
+            mode = "ab"
+        else:
+            # Fresh download, the server ignored the Range header, or the file changed (If-Range failed)
+            mode, offset = "wb", 0
+            encoded = response.headers.get("content-encoding", "identity") != "identity"
+            length = response.headers.get("content-length")
+            total = int(length) if length is not None and not encoded else None
+            with open(meta_path, "w") as f:
+                json.dump({"validator": response.headers.get("etag") or response.headers.get("last-modified"),
+                           "total": total}, f)
+        written = 0
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+        # Content-Length counts bytes on the wire, which differ from the decoded
+        # bytes iter_content yields when the response is gzip-encoded
+        received = response.raw.tell() if hasattr(response.raw, "tell") else written
+        expected = response.headers.get("content-length")
+        if expected is not None and received != int(expected):
+            raise IOError(f"Truncated download of {file_name}: {received} of {expected} bytes")
+        size = os.path.getsize(part_path)
+        if total is not None and size != total:
+            raise IOError(f"Download of {file_name} has {size} bytes, expected {total}")
+        return written, offset
+    finally:
+        response.close()
+
+def fetch_file(session, file_name, file_id, dest_dir=None, retries=PREFETCH_RETRIES, base_url=None, force=False):
+    dest_dir = dest_dir or DOWNLOAD_DIR
+    path = os.path.join(dest_dir, file_name)
+    result = {"file": file_name, "bytes": 0, "seconds": 0.0, "attempts": 0, "resumed_from": 0}
+    if os.path.isfile(path) and not force:
+        result.update(status="cached", bytes=os.path.getsize(path))
+        return result
+
+    part_path = f"{path}.part"
+    # A .part left behind by an earlier run is resumed, not re-fetched
+    initial = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        if initial and not (os.path.exists(part_path) and os.path.getsize(part_path) >= initial):
+            initial = 0  # The earlier .part was discarded; everything is fetched in this run
+        try:
+            _, offset = _download(session, file_name, file_id, part_path, base_url)
+            if not offset:
+                initial = 0
+            if offset and not result["resumed_from"]:
+                result["resumed_from"] = offset
+            os.replace(part_path, path)
+            _discard_partial(part_path)
+            result["status"] = "ok"
+            result.pop("error", None)
+            break
+        except Exception as e:
+            # Keep the .part file so the next attempt resumes where this one stopped
+            # (unless _download found it no longer matches the file and discarded it)
+            logger.warning(f"Prefetch of {file_name} failed (attempt {attempt + 1}/{retries + 1}): {e}")
+            result.update(status="error", error=str(e))
+            if attempt < retries:
+                time.sleep(_backoff(attempt))
+    result["seconds"] = time.perf_counter() - start
+    if result["status"] == "ok":
+        result["bytes"] = os.path.getsize(path) - initial
+    result["throughput"] = result["bytes"] / result["seconds"] if result["seconds"] > 0 else 0.0
+    return result
+
+def prefetch(files=None, dest_dir=None, max_workers=PREFETCH_WORKERS, retries=PREFETCH_RETRIES, base_url=None, force=False, session=None):
+    files = all_files() if files is None else files
+    dest_dir = dest_dir or DOWNLOAD_DIR
+    os.makedirs(dest_dir, exist_ok=True)
+    session = session or create_session(max_workers)
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch") as pool:
+        futures = [
+            pool.submit(fetch_file, session, name, file_id, dest_dir, retries, base_url, force)
+            for name, file_id in files.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            logger.info(
+                f"Prefetch {result['file']}: {result['status']}, {result['bytes']} bytes"
+                f" in {result['seconds']:.2f}s ({result.get('throughput', 0) / 1e6:.2f} MB/s)"
+            )
+    elapsed = time.perf_counter() - start
+    total = sum(r["bytes"] for r in results if r["status"] == "ok")
+    summary = {
+        "files": sorted(results, key=lambda r: r["file"]),
+        "seconds": elapsed,
+        "bytes": total,
+        "throughput": total / elapsed if elapsed > 0 else 0.0,
+        "failed": sorted(r["file"] for r in results if r["status"] == "error"),
+    }
+    return summary
+
+_background = None
+_background_lock = threading.Lock()
+
+def prefetch_in_background(**kwargs):
+    # Fire-and-forget warmup; loaders fall back to Drive for anything not yet on disk
+    global _background
+    with _background_lock:
+        if _background is None or not _background.is_alive():
+            _background = threading.Thread(target=prefetch, kwargs=kwargs, name="prefetch", daemon=True)
+            _background.start()
+    return _background
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download all model artifacts and datasets in parallel")
+    parser.add_argument("--dest", default=DOWNLOAD_DIR)
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS)
+    parser.add_argument("--retries", type=int, default=PREFETCH_RETRIES)
+    parser.add_argument("--base-url", default=None, help="Drive-compatible endpoint, e.g. a local test server")
+    parser.add_argument("--force", action="store_true", help="Re-download files that already exist")
+    parser.add_argument("--only", nargs="*", help="Restrict to these file names")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    files = all_files()
+    if args.only:
+        files = {name: files[name] for name in args.only}
+    summary = prefetch(files, args.dest, args.workers, args.retries, args.base_url, args.force)
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        raise SystemExit(1)
@@ -6,6 +6,9 @@ from tqdm import tqdm
 from sklearn.utils import resample
 import logging
 import os
+import hashlib
+import json
+from embedding_store import EmbeddingStore, deduplicate
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +18,8 @@ logger = logging.getLogger(__name__)
 input_path = "data/creditcard_with_descriptions.csv"
 embeddings_path = "data/finbert_embeddings.npy"
 labels_path = "data/finbert_labels.csv"
+embedding_cache_path = "data/finbert_embedding_cache.npz"
+model_name = "ProsusAI/finbert"
 
 # Ensure output directories exist
 os.makedirs(os.path.dirname(embeddings_path), exist_ok=True)
@@ -51,8 +56,8 @@ except Exception as e:
 
 # Initialize FinBERT
 try:
-    tokenizer = AutoTokenizer.from_pretrained("ProsusAI/finbert")
-    model = AutoModel.from_pretrained("ProsusAI/finbert")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     model.to(device)
     model.eval()
@@ -62,33 +67,102 @@ except Exception as e:
     raise
 
 # Generate embeddings
-def get_finbert_embeddings(texts, batch_size=8):
-    embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size), desc="Generating embeddings"):
-        batch_texts = texts[i:i + batch_size]
-        try:
-            inputs = tokenizer(
-                batch_texts,
-                padding=True,
-                truncation=True,
-                max_length=128,
-                return_tensors="pt"
-            ).to(device)
-            with torch.no_grad():
-                outputs = model(**inputs)
-                batch_embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-            embeddings.append(batch_embeddings)
-            del inputs, outputs
-            torch.cuda.empty_cache()
-        except Exception as e:
-            logger.error(f"Error processing batch at index {i}: {str(e)}")
-            raise
-    return np.vstack(embeddings)
-
-# Generate and save embeddings
+def plan_batches(lengths, max_tokens=4096, max_batch_size=128):
+    # Sort by token length and cut batches under a padded-token budget, so
+    # short texts are not padded to the longest text of a random batch
+    order = np.argsort(lengths, kind="stable")
+    batches, current = [], []
+    for i in order:
+        # Ascending order: the text being added is the batch's longest
+        if current and ((len(current) + 1) * lengths[i] > max_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+        current.append(int(i))
+    if current:
+        batches.append(current)
+    return batches
+
+def embed_batch(encodings, batch):
+    inputs = tokenizer.pad({k: [encodings[k][i] for i in batch] for k in encodings.keys()}, return_tensors="pt").to(device)
+    with torch.inference_mode():
+        outputs = model(**inputs)
+    return outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+def _scatter(out, codes, unique_ids, vectors, n_uniques):
+    # Write each vector to every row sharing that text
+    position = np.full(n_uniques, -1)
+    position[unique_ids] = np.arange(len(unique_ids))
+    rows = np.flatnonzero(position[codes] >= 0)
+    out[rows] = vectors[position[codes[rows]]]
+
+def write_finbert_embeddings(texts, out_path, store, checkpoint_every=50, max_tokens=4096):
+    # Streams embeddings into a preallocated .npy memmap. Vectors finished since
+    # the last checkpoint are appended to the embedding store as a shard, so a
+    # rerun after a crash reopens the same output and only embeds what is still
+    # missing. The store is compacted into one file at the end.
+    uniques, keys, codes = deduplicate(texts)
+    dim = model.config.hidden_size
+    # Row order is part of the input: the same texts reordered must not reuse old rows
+    digest = hashlib.sha1("\n".join([model_name, str(len(texts))] + keys).encode())
+    digest.update(codes.astype(np.int64).tobytes())
+    fingerprint = digest.hexdigest()
+    checkpoint_path = f"{out_path}.checkpoint.json"
+    checkpoint = {}
+    if os.path.exists(checkpoint_path) and os.path.exists(out_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    if checkpoint.get("fingerprint") == fingerprint:
+        if checkpoint.get("complete"):
+            logger.info(f"{out_path} is already complete for this input")
+            return np.load(out_path, mmap_mode="r")
+        out = np.lib.format.open_memmap(out_path, mode="r+")
+        logger.info(f"Resuming {out_path} from checkpoint")
+    else:
+        out = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(len(texts), dim))
+        _write_json(checkpoint_path, {"fingerprint": fingerprint, "complete": False})
+
+    # Rows whose text is already embedded are filled straight from the store
+    cached = np.array([key in store for key in keys], dtype=bool)
+    if cached.any():
+        cached_ids = np.flatnonzero(cached)
+        _scatter(out, codes, cached_ids, np.stack([store.get(keys[i]) for i in cached_ids]), len(uniques))
+    missing = np.flatnonzero(~cached)
+    logger.info(f"{len(texts)} texts, {len(uniques)} unique, {len(missing)} to embed")
+
+    if len(missing):
+        encodings = tokenizer([uniques[i] for i in missing], truncation=True, max_length=128)
+        lengths = np.array([len(ids) for ids in encodings["input_ids"]])
+        batches = plan_batches(lengths, max_tokens)
+        for n, batch in enumerate(tqdm(batches, desc="Generating embeddings"), start=1):
+            try:
+                vectors = embed_batch(encodings, batch)
+            except Exception as e:
+                logger.error(f"Error processing batch {n}/{len(batches)}: {str(e)}")
+                raise
+            unique_ids = missing[batch]
+            store.put_many([keys[i] for i in unique_ids], vectors)
+            _scatter(out, codes, unique_ids, vectors, len(uniques))
+            if n % checkpoint_every == 0 or n == len(batches):
+                out.flush()
+                store.append()
+                _write_json(checkpoint_path, {"fingerprint": fingerprint, "complete": False, "batches_done": n, "batches": len(batches)})
+
+    out.flush()
+    store.save()
+    _write_json(checkpoint_path, {"fingerprint": fingerprint, "complete": True})
+    return out
+
+# Generate and save embeddings. Descriptions come from a small template space,
+# so only distinct texts not already in the persistent cache go through FinBERT
 try:
-    embeddings = get_finbert_embeddings(descriptions)
-    np.save(embeddings_path, embeddings)
+    embedding_store = EmbeddingStore(embedding_cache_path, model_name).load()
+    write_finbert_embeddings(descriptions, embeddings_path, embedding_store)
     logger.info(f"FinBERT embeddings saved to {embeddings_path}")
     pd.DataFrame({'Class': labels}).to_csv(labels_path, index=False)
     logger.info(f"Labels saved to {labels_path}")
@@ -96,4 +170,4 @@ except Exception as e:
     logger.error(f"Error saving embeddings or labels: {str(e)}")
     raise
 
-print(f"FinBERT embeddings saved to {embeddings_path}, labels to {labels_path}")
\ No newline at end of file
+print(f"FinBERT embeddings saved to {embeddings_path}, labels to {labels_path}")
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import pickle
 from model_loader import load_from_drive
+from singleflight import SingleFlight
+from tracing import span
 
 # Categorical mappings for loan default
 CATEGORICAL_MAPPINGS = {
@@ -28,15 +30,37 @@ CATEGORICAL_MAPPINGS = {
     }
 }
 
+# Column order the scalers and models were fitted with
+LOAN_FEATURES = [
+    'Age', 'Income', 'LoanAmount', 'CreditScore', 'MonthsEmployed',
+    'NumCreditLines', 'InterestRate', 'LoanTerm', 'DTIRatio',
+    'Education', 'EmploymentType', 'MaritalStatus', 'HasMortgage',
+    'HasDependents', 'LoanPurpose', 'HasCoSigner'
+]
+CREDIT_RISK_FEATURES = [
+    'person_age', 'person_income', 'person_home_ownership', 'person_emp_length',
+    'loan_intent', 'loan_grade', 'loan_amnt', 'loan_int_rate',
+    'loan_percent_income', 'cb_person_default_on_file', 'cb_person_cred_hist_length'
+]
+
 # Loading encoders for credit risk
+CREDIT_RISK_ENCODER_COLS = ['person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file']
 credit_risk_encoders = {}
-credit_risk_encoders = {}
-for col in ['person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file']:
+encoder_loads = SingleFlight("encoders")
+
+def _load_encoder(col):
     try:
-        credit_risk_encoders[col] = load_from_drive(f"le_{col}.pkl")
+        return load_from_drive(f"le_{col}.pkl")
     except Exception as e:  # Broader catch for drive load errors
         raise ValueError(f"Credit risk encoder for {col} not found: {str(e)}")
 
+def load_credit_risk_encoders():
+    # Loaded on first use; concurrent first users share a single download per encoder
+    for col in CREDIT_RISK_ENCODER_COLS:
+        if col not in credit_risk_encoders:
+            credit_risk_encoders[col] = encoder_loads.do(col, _load_encoder, col)
+    return credit_risk_encoders
+
 def preprocess_input(data, scaler, model_type='loan_default'):
     if model_type == 'loan_default':
         # Handle DataFrame input for loan default
@@ -46,12 +70,7 @@ def preprocess_input(data, scaler, model_type='loan_default'):
             df = pd.DataFrame([data])
         
         # Define feature order
-        feature_order = [
-            'Age', 'Income', 'LoanAmount', 'CreditScore', 'MonthsEmployed',
-            'NumCreditLines', 'InterestRate', 'LoanTerm', 'DTIRatio',
-            'Education', 'EmploymentType', 'MaritalStatus', 'HasMortgage',
-            'HasDependents', 'LoanPurpose', 'HasCoSigner'
-        ]
+        feature_order = LOAN_FEATURES
         
         df_encoded = df.copy()
         
@@ -101,21 +120,19 @@ def preprocess_input(data, scaler, model_type='loan_default'):
         if not isinstance(data, dict):
             raise ValueError("Credit risk input must be a dictionary")
         input_dict = {k: v.lower().strip() if isinstance(v, str) else v for k, v in data.items()}
+        encoders = load_credit_risk_encoders()
         # input_dict = data.copy()
         
         # Validate and encode categorical variables
-        for col in ['person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file']:
-            valid_values = credit_risk_encoders[col].classes_.tolist()
-            if input_dict[col].lower().strip() not in [v.lower() for v in valid_values]:
-                raise ValueError(f"Invalid {col}. Must be one of {valid_values}")
-            input_dict[col] = credit_risk_encoders[col].transform([input_dict[col].lower().strip()])[0]
+        with span("encode"):
+            for col in CREDIT_RISK_ENCODER_COLS:
+                valid_values = encoders[col].classes_.tolist()
+                if input_dict[col].lower().strip() not in [v.lower() for v in valid_values]:
+                    raise ValueError(f"Invalid {col}. Must be one of {valid_values}")
+                input_dict[col] = encoders[col].transform([input_dict[col].lower().strip()])[0]
         
         # Order features
-        features = [
-            'person_age', 'person_income', 'person_home_ownership', 'person_emp_length',
-            'loan_intent', 'loan_grade', 'loan_amnt', 'loan_int_rate',
-            'loan_percent_income', 'cb_person_default_on_file', 'cb_person_cred_hist_length'
-        ]
+        features = CREDIT_RISK_FEATURES
         
         # Validate numeric features
         numeric_cols = [
@@ -132,7 +149,8 @@ def preprocess_input(data, scaler, model_type='loan_default'):
         processed_input = [input_dict[feature] for feature in features]
         
         # Scale features
-        processed_input = scaler.transform([processed_input])[0]
+        with span("scale"):
+            processed_input = scaler.transform([processed_input])[0]
         return processed_input
     
     else:
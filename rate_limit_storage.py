@@ -0,0 +1,141 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from math import floor
+from urllib.parse import urlparse
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+# A `limits` storage backed by one SQLite file, so every worker on a host
+# shares the same rate-limit counters. Importing this module registers the
+# sqlite:// scheme, so slowapi's Limiter(storage_uri="sqlite:///data/rate_limits.db")
+# picks it up. As with SQLAlchemy, three slashes give a relative path and four
+# an absolute one. With several hosts, point RATE_LIMIT_STORAGE at Redis instead.
+#
+# Each check is one BEGIN IMMEDIATE transaction. It reads two counter rows by
+# primary key and upserts one, so the cost is O(1) and concurrent workers
+# cannot both take the last slot. Connections open on first use, one per
+# thread and process, so the storage survives forking workers.
+
+CLEANUP_PROBABILITY = 0.001  # Expired rows are deleted on roughly 1 in 1000 writes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rate_limits_expires_at ON rate_limits (expires_at);
+"""
+
+_INCR = """
+INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,
+    expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+RETURNING count
+"""
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, timeout=5.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urlparse(uri or "sqlite:///data/rate_limits.db").path
+        # sqlite:///relative.db -> "relative.db", sqlite:////abs.db -> "/abs.db"
+        self.path = path[1:] if path.startswith("/") else path
+        if not self.path:
+            raise ValueError("SQLite rate limit storage needs a file path, e.g. sqlite:///data/rate_limits.db")
+        self.timeout = float(timeout)
+        self._local = threading.local()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit; transactions are opened explicitly where atomicity matters
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, conn, key, now):
+        row = conn.execute("SELECT count, expires_at FROM rate_limits WHERE key = ? AND expires_at > ?",
+                           (key, now)).fetchone()
+        return (row[0], row[1]) if row else (0, now)
+
+    def _incr(self, conn, key, expiry, amount, now):
+        count = conn.execute(_INCR, (key, amount, now + expiry, now, now)).fetchone()[0]
+        if random.random() < CLEANUP_PROBABILITY:
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def incr(self, key, expiry, amount=1):
+        conn = self._conn()
+        return self._incr(conn, key, expiry, amount, time.time())
+
+    def get(self, key):
+        return self._count(self._conn(), key, time.time())[0]
+
+    def get_expiry(self, key):
+        return self._count(self._conn(), key, time.time())[1]
+
+    def clear(self, key):
+        self._conn().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def check(self):
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conn().execute("DELETE FROM rate_limits").rowcount
+
+    def _window(self, conn, key, expiry, now):
+        # Same window arithmetic as limits' MemoryStorage, on timestamped keys
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._count(conn, previous_key, now)[0]
+        current_count = self._count(conn, current_key, now)[0]
+        previous_ttl = 0.0 if previous_count == 0 else (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl, current_key
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        conn = self._conn()
+        now = time.time()
+        # The write lock is taken before reading, so check-and-increment is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous_count, previous_ttl, current_count, _, current_key = self._window(conn, key, expiry, now)
+            allowed = floor(previous_count * previous_ttl / expiry + current_count) + amount <= limit
+            if allowed:
+                # Twice the window, so the count is still there while it is the previous window
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def get_sliding_window(self, key, expiry):
+        return self._window(self._conn(), key, expiry, time.time())[:4]
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
@@ -0,0 +1,85 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# Every SingleFlight registers here so its counters can be reported together.
+# The same counters go to Prometheus, labelled by group name
+_groups = {}
+
+# Coalesces concurrent calls for the same key into one execution: the first
+# caller runs the function and everyone arriving while it is in progress shares
+# its result or exception. `do` is for threads; `do_async` runs the function in
+# the default executor so the event loop is never blocked while waiting.
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"loads": 0, "coalesced": 0, "errors": 0, "load_seconds": 0.0, "in_flight": 0}
+        _groups[name] = self
+
+    def _begin(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                metrics.SINGLEFLIGHT_CALLS.labels(self.name, "coalesced").inc()
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["loads"] += 1
+            self._stats["in_flight"] += 1
+            metrics.SINGLEFLIGHT_CALLS.labels(self.name, "load").inc()
+            metrics.SINGLEFLIGHT_IN_FLIGHT.labels(self.name).inc()
+            return future, True
+
+    def _run(self, key, future, fn, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, start, failed=True)
+            future.set_exception(e)
+        else:
+            self._finish(key, start, failed=False)
+            future.set_result(result)
+
+    def _finish(self, key, start, failed):
+        with self._lock:
+            # Drop the key before waking waiters so the next call starts a fresh load
+            del self._calls[key]
+            seconds = time.perf_counter() - start
+            self._stats["in_flight"] -= 1
+            self._stats["load_seconds"] += seconds
+            metrics.SINGLEFLIGHT_IN_FLIGHT.labels(self.name).dec()
+            metrics.SINGLEFLIGHT_SECONDS.labels(self.name).inc(seconds)
+            if failed:
+                self._stats["errors"] += 1
+                metrics.SINGLEFLIGHT_ERRORS.labels(self.name).inc()
+
+    def do(self, key, fn, *args, **kwargs):
+        future, leader = self._begin(key)
+        if leader:
+            self._run(key, future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        future, leader = self._begin(key)
+        if leader:
+            # Carry the leader's context (request ID, trace spans) into the worker thread
+            context = contextvars.copy_context()
+            asyncio.get_running_loop().run_in_executor(None, context.run, self._run, key, future, fn, args, kwargs)
+        # Shielded: a cancelled caller (e.g. a client disconnect) stops waiting
+        # without cancelling the shared future the other callers are waiting on
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+def all_stats():
+    return {name: group.stats() for name, group in _groups.items()}
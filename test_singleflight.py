@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+from singleflight import SingleFlight
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    async def scenario():
+        group = SingleFlight("test_cancel")
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return "model"
+
+        first = asyncio.create_task(group.do_async("m", load))
+        second = asyncio.create_task(group.do_async("m", load))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        return results, calls, group.stats()
+
+    (first, second), calls, stats = asyncio.run(scenario())
+    assert isinstance(first, asyncio.CancelledError)
+    assert second == "model"
+    assert len(calls) == 1
+    assert stats["coalesced"] == 1 and stats["errors"] == 0 and stats["in_flight"] == 0
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        group = SingleFlight("test_errors")
+
+        def load():
+            raise ValueError("bad artifact")
+
+        return await asyncio.gather(group.do_async("m", load), group.do_async("m", load), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
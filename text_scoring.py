@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from embedding_store import EMBEDDING_CACHE_PATH, EmbeddingStore, normalize_text, text_key
+from model_loader import load_from_drive
+from singleflight import SingleFlight
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Scores transaction descriptions with the FinBERT + logistic regression model
+# from train_finbert_classifier.py. Descriptions are mostly templated, so CLS
+# vectors sit in a bounded LRU keyed by normalized text. Misses from concurrent
+# requests are collected for a few milliseconds and embedded in one forward
+# pass on a single encoder thread. The encoder is loaded on the first miss.
+
+FINBERT_MODEL = os.getenv("FINBERT_MODEL", "ProsusAI/finbert")
+FINBERT_THREADS = int(os.getenv("FINBERT_THREADS", "2"))
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", "10000"))
+TEXT_BATCH_WAIT_MS = float(os.getenv("TEXT_BATCH_WAIT_MS", "5"))
+TEXT_MAX_BATCH = int(os.getenv("TEXT_MAX_BATCH", "64"))
+TEXT_MAX_LENGTH = 128  # Same truncation as preprocess_finbert.py
+
+class LRUEmbeddingCache:
+    def __init__(self, maxsize=TEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            vector = self._data.get(key)
+            metrics.cache_lookup("text_embeddings", vector is not None)
+            if vector is None:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def seed(self, store):
+        # Warm from the persistent cache written by preprocess_finbert.py
+        keys = store.keys()[-self.maxsize:]
+        for key in keys:
+            self.put(key, store.get(key))
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._data), maxsize=self.maxsize)
+
+class FinBERTEncoder:
+    # Tokenizer and model load on first use; every forward pass runs on one
+    # dedicated thread so the encoder never competes with itself for cores
+    def __init__(self, model_name=FINBERT_MODEL, threads=FINBERT_THREADS):
+        self.model_name = model_name
+        self.threads = threads
+        self.tokenizer = None
+        self.model = None
+        self._loads = SingleFlight("finbert")
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finbert")
+        self._stats = {"batches": 0, "texts": 0, "seconds": 0.0}
+
+    def _load(self):
+        from transformers import AutoTokenizer, AutoModel
+        # Process-wide: also bounds the fraud LSTM, which is far lighter
+        torch.set_num_threads(self.threads)
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+        self.tokenizer, self.model = tokenizer, model
+        logger.info(f"Loaded {self.model_name} with {self.threads} threads")
+
+    def ensure_loaded(self):
+        if self.model is None:
+            self._loads.do(self.model_name, self._load)
+
+    def embed(self, texts):
+        self.ensure_loaded()
+        start = time.perf_counter()
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=TEXT_MAX_LENGTH, return_tensors="pt")
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
+        vectors = outputs.last_hidden_state[:, 0, :].float().numpy()
+        seconds = time.perf_counter() - start
+        self._stats["batches"] += 1
+        self._stats["texts"] += len(texts)
+        self._stats["seconds"] += seconds
+        metrics.TEXT_ENCODER_SECONDS.observe(seconds)
+        return vectors
+
+    def stats(self):
+        return dict(self._stats, loaded=self.model is not None)
+
+class MicroBatcher:
+    # Collects cache misses from concurrent requests and embeds them together.
+    # A batch closes after TEXT_BATCH_WAIT_MS or once TEXT_MAX_BATCH distinct
+    # texts are waiting; identical texts in flight share one future.
+    def __init__(self, encoder, cache, max_batch=TEXT_MAX_BATCH, wait_ms=TEXT_BATCH_WAIT_MS):
+        self.encoder = encoder
+        self.cache = cache
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._pending = {}
+        self._queue = None
+        self._task = None
+        self._stats = {"batches": 0, "texts": 0, "coalesced": 0}
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._pending = {}
+            self._task = loop.create_task(self._worker())
+
+    async def embed(self, key, text):
+        self._ensure_worker()
+        future = self._pending.get(key)
+        if future is not None and not future.done():
+            self._stats["coalesced"] += 1
+            metrics.TEXT_COALESCED.inc()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            await self._queue.put((key, text, future))
+        # Shielded: a disconnecting client cancels only its own wait, not the
+        # future other requests for the same text are waiting on
+        return await asyncio.shield(future)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            keys, texts, futures = zip(*batch)
+            try:
+                vectors = await loop.run_in_executor(self.encoder.executor, self.encoder.embed, list(texts))
+            except Exception as e:
+                for key, future in zip(keys, futures):
+                    self._release(key, future)
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(keys)
+            metrics.TEXT_BATCH_SIZE.observe(len(keys))
+            for key, future, vector in zip(keys, futures, vectors):
+                self.cache.put(key, vector)
+                self._release(key, future)
+                if not future.done():
+                    future.set_result(vector)
+
+    def _release(self, key, future):
+        # Only the entry this batch created; a newer request may have replaced it
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    def stats(self):
+        return dict(self._stats, queued=self._queue.qsize() if self._queue else 0)
+
+class TextScorer:
+    def __init__(self, encoder=None, cache=None, classifier=None):
+        self.encoder = encoder or FinBERTEncoder()
+        self.cache = cache or LRUEmbeddingCache()
+        self.batcher = MicroBatcher(self.encoder, self.cache)
+        self.classifier = classifier
+        self._classifier_loads = SingleFlight("finbert_classifier")
+        self._seeded = False
+
+    def _load_classifier(self):
+        classifier = load_from_drive("finbert_classifier.pkl")
+        if not self._seeded and os.path.exists(EMBEDDING_CACHE_PATH):
+            seeded = self.cache.seed(EmbeddingStore(EMBEDDING_CACHE_PATH, self.encoder.model_name).load())
+            logger.info(f"Seeded text embedding cache with {seeded} vectors")
+        self._seeded = True
+        return classifier
+
+    async def score(self, texts):
+        if self.classifier is None:
+            self.classifier = await self._classifier_loads.do_async("finbert_classifier.pkl", self._load_classifier)
+        keys = [text_key(normalize_text(t)) for t in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            embedded = await asyncio.gather(*(self.batcher.embed(keys[i], normalize_text(texts[i])) for i in misses))
+            for i, vector in zip(misses, embedded):
+                vectors[i] = vector
+        return self.classifier.predict_proba(np.stack(vectors))[:, 1]
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "batcher": self.batcher.stats(), "encoder": self.encoder.stats()}
+
+_scorer = None
+
+def get_scorer():
+    global _scorer
+    if _scorer is None:
+        _scorer = TextScorer()
+    return _scorer
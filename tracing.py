@@ -0,0 +1,143 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Per-request stage timings and an on-demand profiler.
+#
+# Handlers wrap their stages in `with span("name"):`. The middleware collects
+# the spans of the current request and returns them in a Server-Timing header
+# ("load_model;dur=12.1, predict;dur=0.8, total;dur=14.0"). Outside a request,
+# or with SERVER_TIMING=0, span() only checks a context variable.
+#
+# Profiling is admin-only. A request carrying X-Profile: 1 and a valid
+# X-Admin-Token is profiled with cProfile. Separately, /admin/profiler can turn
+# on sampling of a fraction of all requests. Results from both are merged into
+# one pstats aggregate per worker, which can be read or dumped to PROFILE_DIR.
+# One request is profiled at a time; cProfile sees the whole event loop thread,
+# so concurrent coroutines show up in the same profile.
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+
+_spans = ContextVar("spans", default=None)
+
+@contextmanager
+def _record(spans, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - start))
+
+_NULL = nullcontext()
+
+def span(name):
+    spans = _spans.get()
+    if spans is None:
+        return _NULL
+    return _record(spans, name)
+
+def server_timing(spans, total):
+    # Repeated stage names (e.g. per-encoder spans) are summed
+    merged = {}
+    for name, seconds in spans:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+class Profiler:
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.profiled = 0
+        self._stats = None
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def should_profile(self, forced):
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self):
+        # Skip rather than wait when another request is already being profiled
+        if not self._busy.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.profiled += 1
+        finally:
+            self._busy.release()
+
+    def report(self, limit=30, sort="cumulative"):
+        with self._lock:
+            if self._stats is None:
+                return ""
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def dump(self):
+        with self._lock:
+            if self._stats is None:
+                return None
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{int(time.time())}.prof")
+            self._stats.dump_stats(path)
+            return path
+
+    def reset(self):
+        with self._lock:
+            self._stats = None
+            self.profiled = 0
+
+    def status(self):
+        return {"sample_rate": self.sample_rate, "profiled_requests": self.profiled, "pid": os.getpid()}
+
+profiler = Profiler()
+
+def is_admin(request):
+    return ADMIN_TOKEN is not None and request.headers.get("x-admin-token") == ADMIN_TOKEN
+
+def instrument(app):
+    @app.middleware("http")
+    async def trace_request(request, call_next):
+        forced = request.headers.get("x-profile") == "1" and is_admin(request)
+        profiling = profiler.should_profile(forced)
+        if not SERVER_TIMING and not profiling:
+            return await call_next(request)
+        spans = []
+        token = _spans.set(spans)
+        start = time.perf_counter()
+        try:
+            if profiling:
+                with profiler.profile():
+                    response = await call_next(request)
+            else:
+                response = await call_next(request)
+        finally:
+            _spans.reset(token)
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = server_timing(spans, time.perf_counter() - start)
+        return response
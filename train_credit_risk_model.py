@@ -1,70 +1,194 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold, ParameterGrid
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score
 import pickle
 import os
+import argparse
+import json
+import math
+import time
+import warnings
 
 # Paths
 DATA_PATH = "data/credit_risk_data_cleaned.csv"
 MODEL_DIR = "backend/model"
 
-# Load the cleaned dataset
-data = pd.read_csv(DATA_PATH)
-
-# Preprocess categorical variables
-label_encoders = {}
 categorical_cols = ['person_home_ownership', 'loan_intent', 'loan_grade', 'cb_person_default_on_file']
-for col in categorical_cols:
-    le = LabelEncoder()
-    data[col] = le.fit_transform(data[col])
-    label_encoders[col] = le
-
 # Define features (X) and target (y)
 features = ['person_age', 'person_income', 'person_home_ownership', 'person_emp_length',
             'loan_intent', 'loan_grade', 'loan_amnt', 'loan_int_rate',
             'loan_percent_income', 'cb_person_default_on_file', 'cb_person_cred_hist_length']
-X = data[features]
-y = data['loan_status']
-
-# Split the data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-# Scale the features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-# Train the Random Forest Classifier with hyperparameter tuning
-rf_model = RandomForestClassifier(random_state=42, class_weight='balanced')
 param_grid = {
     'n_estimators': [100, 200],
     'max_depth': [10, 20, None],
     'min_samples_split': [2, 5],
     'min_samples_leaf': [1, 2],
 }
-grid_search = GridSearchCV(rf_model, param_grid, cv=5, scoring='accuracy', n_jobs=-1)
-grid_search.fit(X_train_scaled, y_train)
-
-# Best model
-best_model = grid_search.best_estimator_
-print(f"Best Hyperparameters: {grid_search.best_params_}")
-
-# Evaluate the model
-y_pred = best_model.predict(X_test_scaled)
-accuracy = accuracy_score(y_test, y_pred)
-print(f"Model Accuracy: {accuracy:.2f}")
-
-# Save the model, scaler, and label encoders
-os.makedirs(MODEL_DIR, exist_ok=True)
-with open(os.path.join(MODEL_DIR, "credit_risk_model.pkl"), 'wb') as f:
-    pickle.dump(best_model, f)
-with open(os.path.join(MODEL_DIR, "credit_risk_scaler.pkl"), 'wb') as f:
-    pickle.dump(scaler, f)
-for col, le in label_encoders.items():
-    with open(os.path.join(MODEL_DIR, f"le_{col}.pkl"), 'wb') as f:
-        pickle.dump(le, f)
-
-print("Credit risk model, scaler, and label encoders saved successfully in backend/model!")
\ No newline at end of file
+
+# Exhaustive search: every combination x 5 folds of full forests
+def grid_search_model(X_train_scaled, y_train):
+    rf_model = RandomForestClassifier(random_state=42, class_weight='balanced')
+    grid_search = GridSearchCV(rf_model, param_grid, cv=5, scoring='accuracy', n_jobs=-1)
+    grid_search.fit(X_train_scaled, y_train)
+    return grid_search.best_estimator_, grid_search.best_params_, grid_search.best_score_
+
+# Scale each CV fold once; every candidate and round reuses the same arrays.
+# Rows are shuffled per fold so a growing sample budget is always a prefix.
+def cached_folds(X, y, n_splits=5, random_state=42):
+    X, y = np.asarray(X, dtype=float), np.asarray(y)
+    rng = np.random.default_rng(random_state)
+    folds = []
+    for train_idx, val_idx in StratifiedKFold(n_splits, shuffle=True, random_state=random_state).split(X, y):
+        train_idx = rng.permutation(train_idx)
+        fold_scaler = StandardScaler().fit(X[train_idx])
+        folds.append((fold_scaler.transform(X[train_idx]), y[train_idx], fold_scaler.transform(X[val_idx]), y[val_idx]))
+    return folds
+
+# Successive halving over (training rows, n_estimators). Every round each
+# surviving candidate gets more rows and more trees; its forests are
+# warm-started, so earlier trees are kept and only the new ones are fitted.
+# The best third moves on. With a wall-clock budget the search stops after the
+# round in progress and picks the best candidate scored so far. The budget only
+# limits the search: the final forest always gets the grid's largest n_estimators.
+def halving_search_model(X_train, y_train, factor=3, min_estimators=None, budget_seconds=None, random_state=42):
+    start = time.perf_counter()
+    folds = cached_folds(X_train, y_train, random_state=random_state)
+    max_estimators = max(param_grid['n_estimators'])
+    structural = {k: v for k, v in param_grid.items() if k != 'n_estimators'}
+    candidates = list(ParameterGrid(structural))
+    n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+    min_estimators = min_estimators or max(10, max_estimators // factor ** (n_rounds - 1))
+
+    forests = {i: [None] * len(folds) for i in range(len(candidates))}
+    alive = list(forests)
+    scores = {}
+    best = None
+    for rnd in range(n_rounds):
+        last = rnd == n_rounds - 1
+        n_estimators = max_estimators if last else min(max_estimators, min_estimators * factor ** rnd)
+        sample_frac = 1.0 if last else factor ** (rnd - n_rounds + 1)
+        round_scores = {}
+        for i in alive:
+            fold_scores = []
+            for f, (X_fit, y_fit, X_val, y_val) in enumerate(folds):
+                n_rows = max(50, int(len(X_fit) * sample_frac))
+                forest = forests[i][f]
+                if forest is None:
+                    forest = RandomForestClassifier(random_state=random_state, class_weight='balanced', warm_start=True,
+                                                    n_jobs=-1, **candidates[i])
+                forest.set_params(n_estimators=n_estimators)
+                with warnings.catch_warnings():
+                    # Growing prefixes of a shuffled fold keep the class ratio, so
+                    # 'balanced' weights stay consistent across warm starts
+                    warnings.filterwarnings("ignore", message=".*class_weight.*warm_start.*")
+                    forest.fit(X_fit[:n_rows], y_fit[:n_rows])
+                forests[i][f] = forest
+                fold_scores.append(accuracy_score(y_val, forest.predict(X_val)))
+            round_scores[i] = float(np.mean(fold_scores))
+            if budget_seconds is not None and time.perf_counter() - start > budget_seconds:
+                break
+        scores.update(round_scores)
+        ranked = sorted(round_scores, key=round_scores.get, reverse=True)
+        best = ranked[0]
+        print(f"Halving round {rnd}: {len(round_scores)} candidates, {n_estimators} trees, {sample_frac:.0%} rows, "
+              f"best accuracy {round_scores[best]:.4f}")
+        if last:
+            break
+        if budget_seconds is not None and time.perf_counter() - start > budget_seconds:
+            print(f"Search budget of {budget_seconds:g}s used up after round {rnd + 1} of {n_rounds}; "
+                  f"keeping the best candidate so far, trained with {max_estimators} trees")
+            break
+        alive = ranked[:max(1, math.ceil(len(alive) / factor))]
+        # Free the forests of candidates that were dropped
+        for i in set(forests) - set(alive):
+            del forests[i]
+
+    best_params = dict(candidates[best], n_estimators=max_estimators)
+    del forests
+    # Final model is a plain forest on the full training split, scaled the same way as the grid path
+    X_scaled = StandardScaler().fit_transform(X_train)
+    best_model = RandomForestClassifier(random_state=random_state, class_weight='balanced', n_jobs=-1, **best_params)
+    best_model.fit(X_scaled, y_train)
+    return best_model, best_params, scores[best]
+
+def train_credit_risk_model(data, search="halving", budget_seconds=None, report=None):
+    start = time.perf_counter()
+    # Preprocess categorical variables
+    label_encoders = {}
+    for col in categorical_cols:
+        le = LabelEncoder()
+        data[col] = le.fit_transform(data[col])
+        label_encoders[col] = le
+
+    X = data[features]
+    y = data['loan_status']
+
+    # Split the data
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Scale the features
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    if search == "grid":
+        best_model, best_params, best_score = grid_search_model(X_train_scaled, y_train)
+    else:
+        best_model, best_params, best_score = halving_search_model(X_train, y_train, budget_seconds=budget_seconds)
+    print(f"Best Hyperparameters: {best_params}")
+
+    # Evaluate the model
+    y_pred = best_model.predict(X_test_scaled)
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"Model Accuracy: {accuracy:.2f}")
+    if report is not None:
+        report[search] = {"params": best_params, "cv_score": best_score, "test_accuracy": accuracy, "seconds": time.perf_counter() - start}
+    return best_model, scaler, label_encoders
+
+def save_credit_risk_model(best_model, scaler, label_encoders, model_dir=MODEL_DIR):
+    # Save the model, scaler, and label encoders
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, "credit_risk_model.pkl"), 'wb') as f:
+        pickle.dump(best_model, f)
+    with open(os.path.join(model_dir, "credit_risk_scaler.pkl"), 'wb') as f:
+        pickle.dump(scaler, f)
+    for col, le in label_encoders.items():
+        with open(os.path.join(model_dir, f"le_{col}.pkl"), 'wb') as f:
+            pickle.dump(le, f)
+
+def compare_searches(data, budget_seconds=None):
+    # Run both searches on the same data and report halving's speedup and score delta
+    report = {}
+    train_credit_risk_model(data.copy(), "grid", report=report)
+    result = train_credit_risk_model(data.copy(), "halving", budget_seconds, report=report)
+    report["speedup"] = report["grid"]["seconds"] / report["halving"]["seconds"]
+    report["cv_score_delta"] = report["halving"]["cv_score"] - report["grid"]["cv_score"]
+    report["test_accuracy_delta"] = report["halving"]["test_accuracy"] - report["grid"]["test_accuracy"]
+    return result, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the credit risk model")
+    parser.add_argument("--search", choices=["halving", "grid"], default="halving")
+    parser.add_argument("--budget", type=float, default=None, help="Wall-clock budget for the halving search in seconds")
+    parser.add_argument("--compare", action="store_true", help="Also run the full grid and report speedup and score delta")
+    parser.add_argument("--report", default=None, help="Write the search report to this JSON file")
+    args = parser.parse_args()
+
+    # Load the cleaned dataset
+    data = pd.read_csv(DATA_PATH)
+    report = {}
+    if args.compare:
+        (best_model, scaler, label_encoders), report = compare_searches(data, args.budget)
+        print(f"Halving speedup: {report['speedup']:.1f}x, CV score delta {report['cv_score_delta']:+.4f}, "
+              f"test accuracy delta {report['test_accuracy_delta']:+.4f}")
+    else:
+        best_model, scaler, label_encoders = train_credit_risk_model(data, args.search, args.budget, report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    save_credit_risk_model(best_model, scaler, label_encoders)
+    print("Credit risk model, scaler, and label encoders saved successfully in backend/model!")
@@ -2,26 +2,34 @@ import pandas as pd
 import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import DataLoader, TensorDataset, IterableDataset, get_worker_info
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from imblearn.over_sampling import SMOTE
 from sklearn.metrics import precision_recall_curve, auc
-from sklearn.utils import resample
+import argparse
+import json
 import os
 import pickle
+import time
 
-# Set random seed
-torch.manual_seed(42)
-np.random.seed(42)
+DATA_PATH = "data/creditcard.csv"
+FEATURE_STORE_DIR = "data/fraud_features"
+MODEL_DIR = "backend/model"
 
-# Load dataset
-df = pd.read_csv("data/creditcard.csv")
-X = df.drop('Class', axis=1).values
-y = df['Class'].values
+# Define LSTM model
+class LSTMFraudClassifier(nn.Module):
+    def __init__(self, input_dim, hidden_dim, num_layers):
+        super(LSTMFraudClassifier, self).__init__()
+        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
+        self.fc = nn.Linear(hidden_dim, 1)
+        self.sigmoid = nn.Sigmoid()
 
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
+    def forward(self, x):
+        _, (hn, _) = self.lstm(x)
+        out = self.fc(hn[-1])
+        out = self.sigmoid(out)
+        return out
 
 # Sample for training to manage memory
 def sample_data(X_scaled, y, n_samples=50000):
@@ -32,104 +40,341 @@ def sample_data(X_scaled, y, n_samples=50000):
     sample_indices = np.concatenate([non_fraud_sample, fraud_sample])
     return X_scaled[sample_indices], y[sample_indices]
 
-X_sample, y_sample = sample_data(X_scaled, y)
+def in_memory_loaders(data_path, batch_size, num_workers=0, pin_memory=False):
+    # Load dataset
+    df = pd.read_csv(data_path)
+    X = df.drop('Class', axis=1).values
+    y = df['Class'].values
 
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
 
-# Handle class imbalance with SMOTE
-smote = SMOTE(random_state=42)
-X_resampled, y_resampled = smote.fit_resample(X_sample, y_sample)
+    X_sample, y_sample = sample_data(X_scaled, y)
 
-# Reshape for LSTM [samples, timesteps, features]
-X_resampled = X_resampled.reshape(X_resampled.shape[0], 1, X_resampled.shape[1])
+    # Handle class imbalance with SMOTE
+    smote = SMOTE(random_state=42)
+    X_resampled, y_resampled = smote.fit_resample(X_sample, y_sample)
 
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(
-    X_resampled, y_resampled, test_size=0.2, random_state=42, stratify=y_resampled
-)
+    # Reshape for LSTM [samples, timesteps, features]
+    X_resampled = X_resampled.reshape(X_resampled.shape[0], 1, X_resampled.shape[1])
 
-# Convert to PyTorch tensors
-X_train_tensor = torch.FloatTensor(X_train)
-y_train_tensor = torch.FloatTensor(y_train)
-X_test_tensor = torch.FloatTensor(X_test)
-y_test_tensor = torch.FloatTensor(y_test)
+    # Split data
+    X_train, X_test, y_train, y_test = train_test_split(
+        X_resampled, y_resampled, test_size=0.2, random_state=42, stratify=y_resampled
+    )
 
-# Create DataLoader
-train_dataset = TensorDataset(X_train_tensor, y_train_tensor)
-test_dataset = TensorDataset(X_test_tensor, y_test_tensor)
-train_loader = DataLoader(train_dataset, batch_size=64, shuffle=True)
-test_loader = DataLoader(test_dataset, batch_size=64)
+    # Convert to contiguous float32 PyTorch tensors
+    X_train_tensor = torch.from_numpy(np.ascontiguousarray(X_train, dtype=np.float32))
+    y_train_tensor = torch.from_numpy(np.ascontiguousarray(y_train, dtype=np.float32))
+    X_test_tensor = torch.from_numpy(np.ascontiguousarray(X_test, dtype=np.float32))
+    y_test_tensor = torch.from_numpy(np.ascontiguousarray(y_test, dtype=np.float32))
 
-# Define LSTM model
-class LSTMFraudClassifier(nn.Module):
-    def __init__(self, input_dim, hidden_dim, num_layers):
-        super(LSTMFraudClassifier, self).__init__()
-        self.lstm = nn.LSTM(input_dim, hidden_dim, num_layers, batch_first=True)
-        self.fc = nn.Linear(hidden_dim, 1)
-        self.sigmoid = nn.Sigmoid()
-    
-    def forward(self, x):
-        _, (hn, _) = self.lstm(x)
-        out = self.fc(hn[-1])
-        out = self.sigmoid(out)
-        return out
+    # Create DataLoader
+    train_dataset = TensorDataset(X_train_tensor, y_train_tensor)
+    test_dataset = TensorDataset(X_test_tensor, y_test_tensor)
+    loader_options = {"num_workers": num_workers, "pin_memory": pin_memory, "persistent_workers": num_workers > 0}
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, **loader_options)
+    test_loader = DataLoader(test_dataset, batch_size=batch_size, **loader_options)
+    return train_loader, test_loader, scaler, X_train.shape[2]
+
+# --- Streaming mode -------------------------------------------------------
+# The CSV is read once in chunks into a row-major float32 feature store on disk
+# while the scaler is fit with partial_fit. Training then draws class-balanced
+# batches from the memory-mapped store, so memory is bounded by the batch size
+# rather than the dataset size.
+
+def build_feature_store(data_path, store_dir, chunk_size=100000):
+    meta_path = os.path.join(store_dir, "meta.json")
+    source = {"path": os.path.abspath(data_path), "size": os.path.getsize(data_path), "mtime": os.path.getmtime(data_path)}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("source") == source:
+            with open(os.path.join(store_dir, "scaler.pkl"), "rb") as f:
+                return meta, pickle.load(f)
+
+    os.makedirs(store_dir, exist_ok=True)
+    scaler = StandardScaler()
+    rows = 0
+    columns = None
+    with open(os.path.join(store_dir, "features.f32"), "wb") as features, open(os.path.join(store_dir, "labels.i1"), "wb") as labels:
+        for chunk in pd.read_csv(data_path, chunksize=chunk_size):
+            X = chunk.drop('Class', axis=1)
+            columns = columns or X.columns.tolist()
+            X = X.to_numpy(dtype=np.float32)
+            scaler.partial_fit(X)
+            features.write(np.ascontiguousarray(X).tobytes())
+            labels.write(chunk['Class'].to_numpy(dtype=np.int8).tobytes())
+            rows += len(chunk)
+            print(f"Feature store: {rows} rows written")
+
+    meta = {"source": source, "rows": rows, "columns": columns}
+    with open(os.path.join(store_dir, "scaler.pkl"), "wb") as f:
+        pickle.dump(scaler, f)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return meta, scaler
+
+def open_feature_store(store_dir, meta):
+    features = np.memmap(os.path.join(store_dir, "features.f32"), dtype=np.float32, mode="r", shape=(meta["rows"], len(meta["columns"])))
+    labels = np.memmap(os.path.join(store_dir, "labels.i1"), dtype=np.int8, mode="r", shape=(meta["rows"],))
+    return features, labels
+
+def _is_validation(rows, val_fraction):
+    # Stable hash split on the row index; no per-row split table is kept
+    h = (rows.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+    return h < np.uint64(val_fraction * 2 ** 32)
+
+class BalancedFraudStream(IterableDataset):
+    # Yields ready-made [batch, 1, features] batches, half fraud and half
+    # non-fraud, gathered from the memory-mapped store and scaled on the fly
+    def __init__(self, store_dir, meta, scaler, split, n_samples, batch_size, val_fraction=0.2, seed=42):
+        self.store_dir = store_dir
+        self.meta = meta
+        self.mean = scaler.mean_.astype(np.float32)
+        self.scale = scaler.scale_.astype(np.float32)
+        self.split = split
+        self.n_samples = n_samples
+        self.batch_size = batch_size
+        self.val_fraction = val_fraction
+        self.seed = seed
+        self.epoch = 0
+        self._fraud = None
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.n_samples // self.batch_size
+
+    def _fraud_rows(self, labels):
+        # Fraud is rare, so its row list is small even for very large logs
+        if self._fraud is not None:
+            return self._fraud
+        rows = []
+        for start in range(0, len(labels), 1 << 22):
+            rows.append(start + np.flatnonzero(labels[start:start + (1 << 22)] == 1))
+        rows = np.concatenate(rows)
+        rows = rows[_is_validation(rows, self.val_fraction) == (self.split == "val")]
+        if not len(rows):
+            raise ValueError(f"No fraud rows available for the {self.split} split")
+        self._fraud = rows
+        return rows
+
+    def _non_fraud_rows(self, rng, labels, n):
+        # Rejection sampling over all rows: cheap because almost every row is non-fraud
+        picked = np.empty(0, dtype=np.int64)
+        while len(picked) < n:
+            candidates = np.sort(rng.integers(0, len(labels), size=2 * (n - len(picked)) + 16))
+            candidates = candidates[_is_validation(candidates, self.val_fraction) == (self.split == "val")]
+            candidates = candidates[np.asarray(labels[candidates]) == 0]
+            picked = np.concatenate([picked, candidates])
+        return picked[:n]
+
+    def __iter__(self):
+        features, labels = open_feature_store(self.store_dir, self.meta)
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        # Validation draws the same sample every epoch; training reshuffles
+        epoch = 0 if self.split == "val" else self.epoch
+        rng = np.random.default_rng([self.seed, epoch, worker_id])
+        fraud_rows = self._fraud_rows(labels)
+        for _ in range(worker_id, len(self), num_workers):
+            half = self.batch_size // 2
+            rows = np.concatenate([
+                rng.choice(fraud_rows, half, replace=True),
+                self._non_fraud_rows(rng, labels, self.batch_size - half),
+            ])
+            rows.sort()  # Sequential page access on the memmap
+            X = (np.asarray(features[rows]) - self.mean) / self.scale
+            y = np.asarray(labels[rows], dtype=np.float32)
+            perm = rng.permutation(len(rows))
+            yield torch.from_numpy(X[perm]).unsqueeze(1), torch.from_numpy(y[perm])
+
+def streaming_loaders(data_path, batch_size, store_dir=FEATURE_STORE_DIR, n_samples=50000, val_samples=20000, chunk_size=100000, num_workers=0, pin_memory=False):
+    meta, scaler = build_feature_store(data_path, store_dir, chunk_size)
+    train_stream = BalancedFraudStream(store_dir, meta, scaler, "train", int(n_samples * 0.8), batch_size)
+    val_stream = BalancedFraudStream(store_dir, meta, scaler, "val", val_samples, batch_size)
+    # batch_size=None: the stream already yields whole batches. Workers are not
+    # persistent: each epoch must start them from a copy with the new set_epoch()
+    # value, or every epoch would replay the same seeded batches
+    loader_options = {"num_workers": num_workers, "pin_memory": pin_memory}
+    train_loader = DataLoader(train_stream, batch_size=None, **loader_options)
+    test_loader = DataLoader(val_stream, batch_size=None, **loader_options)
+    return train_loader, test_loader, scaler, len(meta["columns"])
+
+def peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+def train(model, train_loader, test_loader, device, num_epochs=50, patience=5, lr=0.001, benchmark=False):
+    # Checkpoints come from the uncompiled module so keys match the serving model
+    base_model = getattr(model, "_orig_mod", model)
+
+    # Loss and optimizer
+    criterion = nn.BCELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+    # Training loop with early stopping
+    best_auprc = 0
+    patience_counter = 0
+    history = []
+    for epoch in range(num_epochs):
+        if hasattr(train_loader.dataset, "set_epoch"):
+            train_loader.dataset.set_epoch(epoch)
+        epoch_start = time.perf_counter()
+        n_train = 0
+        model.train()
+        for inputs, labels in train_loader:
+            inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+            optimizer.zero_grad(set_to_none=True)
+            outputs = model(inputs).squeeze(-1)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+            n_train += len(labels)
+        train_seconds = time.perf_counter() - epoch_start
+
+        # Evaluate; predictions stay tensors and are concatenated once
+        model.eval()
+        y_true = []
+        y_pred_prob = []
+        val_loss = 0
+        with torch.inference_mode():
+            for inputs, labels in test_loader:
+                inputs, labels = inputs.to(device, non_blocking=True), labels.to(device, non_blocking=True)
+                outputs = model(inputs).squeeze(-1)
+                val_loss += criterion(outputs, labels).item()
+                y_true.append(labels)
+                y_pred_prob.append(outputs)
+        y_true = torch.cat(y_true).cpu().numpy()
+        y_pred_prob = torch.cat(y_pred_prob).cpu().numpy()
+
+        val_loss /= len(test_loader)
+        precision, recall, _ = precision_recall_curve(y_true, y_pred_prob)
+        auprc = auc(recall, precision)
+        epoch_seconds = time.perf_counter() - epoch_start
+        history.append({
+            "epoch": epoch + 1,
+            "train_samples": n_train,
+            "train_seconds": train_seconds,
+            "samples_per_sec": n_train / train_seconds if train_seconds > 0 else 0.0,
+            "epoch_seconds": epoch_seconds,
+            "val_loss": val_loss,
+            "auprc": auprc,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        print(f"Epoch {epoch+1}/{num_epochs}, Val Loss: {val_loss:.4f}, AUPRC: {auprc:.4f}, "
+              f"{history[-1]['samples_per_sec']:.0f} samples/s, {epoch_seconds:.2f}s")
+
+        # Benchmarks run a fixed number of epochs and write no checkpoints
+        if benchmark:
+            continue
+
+        # Early stopping
+        if auprc > best_auprc:
+            best_auprc = auprc
+            patience_counter = 0
+            torch.save(base_model.state_dict(), os.path.join(MODEL_DIR, "lstm_fraud_model_best.pth"))
+        else:
+            patience_counter += 1
+            if patience_counter >= patience:
+                print("Early stopping triggered")
+                break
+    return best_auprc, history
+
+def benchmark_report(args, history, threads):
+    # Skip the first epoch in the steady-state numbers: it pays for compilation and warmup
+    steady = history[1:] or history
+    return {
+        "mode": "streaming" if args.streaming else "in_memory",
+        "batch_size": args.batch_size,
+        "lr": args.lr,
+        "threads": threads,
+        "interop_threads": torch.get_num_interop_threads(),
+        "workers": args.workers,
+        "compile": args.compile,
+        "epochs": history,
+        "samples_per_sec": float(np.mean([h["samples_per_sec"] for h in steady])),
+        "epoch_seconds": float(np.mean([h["epoch_seconds"] for h in steady])),
+        "peak_rss_mb": max(h["peak_rss_mb"] for h in history),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the LSTM fraud classifier")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--streaming", action="store_true",
+                        help="Out-of-core mode: chunked scaler fit and balanced sampling from a memory-mapped float32 store")
+    parser.add_argument("--store-dir", default=FEATURE_STORE_DIR)
+    parser.add_argument("--samples", type=int, default=50000, help="Samples drawn per epoch in streaming mode")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--lr", type=float, default=0.001, help="Learning rate at the reference batch size of 64")
+    parser.add_argument("--scale-lr", action="store_true", help="Scale the learning rate linearly with --batch-size / 64")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (torch.set_num_threads)")
+    parser.add_argument("--interop-threads", type=int, default=None, help="Inter-op threads (torch.set_num_interop_threads)")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--pin-memory", action="store_true", help="Pin batch memory for faster host-to-device copies")
+    parser.add_argument("--compile", action="store_true", help="Wrap the model with torch.compile when available")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Run --epochs epochs without early stopping or saving and print a JSON throughput report")
+    parser.add_argument("--report", default=None, help="Also write the benchmark report to this path")
+    args = parser.parse_args()
+
+    # Thread pools must be sized before any parallel work starts
+    if args.interop_threads:
+        torch.set_num_interop_threads(args.interop_threads)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.scale_lr:
+        args.lr = args.lr * args.batch_size / 64
+
+    # Set random seed
+    torch.manual_seed(42)
+    np.random.seed(42)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    if args.streaming:
+        train_loader, test_loader, scaler, input_dim = streaming_loaders(
+            args.data, args.batch_size, args.store_dir, args.samples, chunk_size=args.chunk_size,
+            num_workers=args.workers, pin_memory=args.pin_memory
+        )
+    else:
+        train_loader, test_loader, scaler, input_dim = in_memory_loaders(
+            args.data, args.batch_size, num_workers=args.workers, pin_memory=args.pin_memory
+        )
+
+    # Initialize model
+    hidden_dim = 64
+    num_layers = 2
+    model = LSTMFraudClassifier(input_dim, hidden_dim, num_layers)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    trained = model
+    if args.compile:
+        if hasattr(torch, "compile"):
+            trained = torch.compile(model)
+        else:
+            print("torch.compile is not available in this torch build; running eagerly")
+
+    _, history = train(trained, train_loader, test_loader, device, num_epochs=args.epochs, lr=args.lr, benchmark=args.benchmark)
 
-# Initialize model
-input_dim = X_train.shape[2]
-hidden_dim = 64
-num_layers = 2
-model = LSTMFraudClassifier(input_dim, hidden_dim, num_layers)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-
-# Loss and optimizer
-criterion = nn.BCELoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-
-# Training loop with early stopping
-num_epochs = 50
-best_auprc = 0
-patience = 5
-patience_counter = 0
-for epoch in range(num_epochs):
-    model.train()
-    for inputs, labels in train_loader:
-        inputs, labels = inputs.to(device), labels.to(device)
-        optimizer.zero_grad()
-        outputs = model(inputs).squeeze()
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
-    
-    # Evaluate
-    model.eval()
-    y_pred_prob = []
-    val_loss = 0
-    with torch.no_grad():
-        for inputs, labels in test_loader:
-            inputs, labels = inputs.to(device), labels.to(device)
-            outputs = model(inputs).squeeze()
-            val_loss += criterion(outputs, labels).item()
-            y_pred_prob.extend(outputs.cpu().numpy())
-    
-    val_loss /= len(test_loader)
-    precision, recall, _ = precision_recall_curve(y_test, y_pred_prob)
-    auprc = auc(recall, precision)
-    print(f"Epoch {epoch+1}/{num_epochs}, Val Loss: {val_loss:.4f}, AUPRC: {auprc:.4f}")
-    
-    # Early stopping
-    if auprc > best_auprc:
-        best_auprc = auprc
-        patience_counter = 0
-        torch.save(model.state_dict(), "backend/model/lstm_fraud_model_best.pth")
+    if args.benchmark:
+        report = json.dumps(benchmark_report(args, history, torch.get_num_threads()), indent=2)
+        print(report)
+        if args.report:
+            with open(args.report, "w") as f:
+                f.write(report)
     else:
-        patience_counter += 1
-        if patience_counter >= patience:
-            print("Early stopping triggered")
-            break
-
-# Save model and scaler
-os.makedirs("backend/model", exist_ok=True)
-torch.save(model.state_dict(), "backend/model/lstm_fraud_model.pth")
-with open("backend/model/fraud_scaler.pkl", "wb") as f:
-    pickle.dump(scaler, f)
-print("LSTM model and scaler saved to backend/model/")
\ No newline at end of file
+        # Save model and scaler
+        torch.save(model.state_dict(), os.path.join(MODEL_DIR, "lstm_fraud_model.pth"))
+        with open(os.path.join(MODEL_DIR, "fraud_scaler.pkl"), "wb") as f:
+            pickle.dump(scaler, f)
+        print("LSTM model and scaler saved to backend/model/")